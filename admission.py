@@ -0,0 +1,244 @@
+"""
+Admission control for browser work.
+
+Every lease of a browser first takes an admission slot: a standalone Selenium
+scrape and a tab scheduler's driver take one each. Async scrapes share one
+Chromium, so each takes a fraction of a slot (ASYNC_WEIGHT). A slot is granted
+while the admitted weight stays within max_active and the host has room for
+that much more browser: enough available memory (the cgroup limit of the
+container counts) and a 1-minute load per CPU below max_load_per_cpu. The first
+lease is always admitted, so a small host still serves one at a time.
+Leases over the limit wait in FIFO order for up to their timeout; once
+max_queued are waiting, further ones are rejected right away with
+AdmissionRejected, which the HTTP routes turn into 429 with Retry-After.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from async_scraper import ASYNC_MAX_PAGES
+from metrics import ADMISSIONS, ADMISSION_WAIT_SECONDS
+from scrape_common import is_cancelled
+
+logger = logging.getLogger(__name__)
+
+# Admission configuration (overridable through the environment)
+MAX_ACTIVE = int(os.environ.get('ADMISSION_MAX_ACTIVE', os.environ.get('CHROME_POOL_SIZE', 2)))
+MAX_QUEUED = int(os.environ.get('ADMISSION_MAX_QUEUED', 4))
+QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 20))
+BROWSER_MEMORY_MB = int(os.environ.get('ADMISSION_BROWSER_MB', 350))
+RESERVE_MEMORY_MB = int(os.environ.get('ADMISSION_RESERVE_MB', 150))
+MAX_LOAD_PER_CPU = float(os.environ.get('ADMISSION_MAX_LOAD_PER_CPU', 1.5))
+# Slots one async scrape takes: the pages in flight together weigh about one browser
+ASYNC_WEIGHT = float(os.environ.get('ADMISSION_ASYNC_WEIGHT', 1 / ASYNC_MAX_PAGES))
+# Retry-After when no scrape has finished yet to estimate it from
+DEFAULT_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 30))
+# Waiting scrapes re-check the host this often, since memory frees up without a release
+POLL_SECONDS = 1.0
+
+CGROUP_V2_MEMORY = ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current')
+CGROUP_V1_MEMORY = ('/sys/fs/cgroup/memory/memory.limit_in_bytes', '/sys/fs/cgroup/memory/memory.usage_in_bytes')
+# cgroup v1 reports "no limit" as a huge number instead of "max"
+UNLIMITED_BYTES = 1 << 60
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return None if value == 'max' else int(value)
+
+
+def available_memory_mb():
+    """
+    Memory a new browser can still use: MemAvailable of the host, capped by what
+    is left under the cgroup memory limit. None when neither can be read.
+    """
+    candidates = []
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    candidates.append(int(line.split()[1]) / 1024)
+                    break
+    except (OSError, ValueError):
+        pass
+
+    for limit_path, usage_path in (CGROUP_V2_MEMORY, CGROUP_V1_MEMORY):
+        limit, usage = _read_int(limit_path), _read_int(usage_path)
+        if limit is not None and usage is not None and limit < UNLIMITED_BYTES:
+            candidates.append((limit - usage) / (1024 * 1024))
+            break
+    return min(candidates) if candidates else None
+
+
+def load_per_cpu():
+    """
+    1-minute load average per CPU this process may run on; None where unsupported.
+    """
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return load / max(1, cpus)
+
+
+class AdmissionRejected(Exception):
+    """
+    The host is saturated and the scrape could not be admitted; retry_after is
+    the suggested wait in seconds.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps concurrent browser work by a fixed limit and by the memory and CPU the
+    host has left, with a bounded FIFO queue for the scrapes over the cap.
+    """
+
+    def __init__(self, max_active=MAX_ACTIVE, max_queued=MAX_QUEUED, browser_memory_mb=BROWSER_MEMORY_MB,
+                 reserve_memory_mb=RESERVE_MEMORY_MB, max_load_per_cpu=MAX_LOAD_PER_CPU):
+        self.max_active = max(1, max_active)
+        self.max_queued = max(0, max_queued)
+        self.browser_memory_mb = browser_memory_mb
+        self.reserve_memory_mb = reserve_memory_mb
+        self.max_load_per_cpu = max_load_per_cpu
+        # Admitted leases and their summed weight
+        self._active = 0
+        self._active_weight = 0.0
+        self._waiting = deque()
+        self._avg_scrape_seconds = None
+        self._cond = threading.Condition()
+        self.counters = {'admitted': 0, 'queued': 0, 'rejected': 0, 'cancelled': 0}
+        self.last_block_reason = None
+
+    def _block_reason(self, weight=1.0):
+        # Called with the lock held; None when a lease of this weight fits
+        if self._active == 0:
+            return None
+        if self._active_weight + weight > self.max_active + 1e-9:
+            return 'max_active'
+        memory = available_memory_mb()
+        if memory is not None and memory - self.reserve_memory_mb < self.browser_memory_mb * weight:
+            return 'memory'
+        load = load_per_cpu()
+        if load is not None and self.max_load_per_cpu and load >= self.max_load_per_cpu:
+            return 'cpu'
+        return None
+
+    def retry_after(self):
+        """
+        Seconds a rejected client should wait: about one average scrape.
+        """
+        average = self._avg_scrape_seconds
+        return max(1, math.ceil(average)) if average else DEFAULT_RETRY_AFTER
+
+    def _reject(self, message):
+        # Called with the lock held
+        ADMISSIONS.inc(result='rejected')
+        self.counters['rejected'] += 1
+        return AdmissionRejected(message, self.retry_after())
+
+    def acquire(self, timeout=QUEUE_TIMEOUT, cancel_event=None, weight=1.0):
+        """
+        Take an admission slot (or the given fraction of one), waiting in line
+        for up to timeout seconds (None waits as long as it takes and is never
+        rejected). Returns False when cancel_event was set while waiting; raises
+        AdmissionRejected when the queue is full or the wait timed out.
+        """
+        started = time.monotonic()
+        ticket = object()
+        with self._cond:
+            # Nobody overtakes the scrapes already waiting
+            reason = 'queue' if self._waiting else self._block_reason(weight)
+            if reason is None:
+                self._admit(started, weight)
+                return True
+            if timeout is not None and len(self._waiting) >= self.max_queued:
+                self.last_block_reason = reason
+                raise self._reject(f"Scraper is saturated ({reason}) and {len(self._waiting)} scrapes are waiting")
+
+            logger.info(f"Scrape queued for admission ({reason}, {len(self._waiting)} already waiting)")
+            ADMISSIONS.inc(result='queued')
+            self.counters['queued'] += 1
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    if is_cancelled(cancel_event):
+                        self.counters['cancelled'] += 1
+                        return False
+                    if self._waiting[0] is ticket:
+                        reason = self._block_reason(weight)
+                        if reason is None:
+                            self._admit(started, weight)
+                            return True
+                        self.last_block_reason = reason
+                    wait = POLL_SECONDS
+                    if timeout is not None:
+                        remaining = started + timeout - time.monotonic()
+                        if remaining <= 0:
+                            raise self._reject(f"Scraper is saturated ({reason}); no slot within {timeout:g}s")
+                        wait = min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                # The next in line may fit now
+                self._cond.notify_all()
+
+    def _admit(self, started, weight):
+        # Called with the lock held
+        self._active += 1
+        self._active_weight += weight
+        self.counters['admitted'] += 1
+        ADMISSIONS.inc(result='admitted')
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - started)
+
+    def release(self, seconds=None, weight=1.0):
+        """
+        Give back what acquire took; seconds (how long the scrape ran) feeds the Retry-After estimate.
+        """
+        with self._cond:
+            self._active -= 1
+            # Rounded so fractional weights do not leave float residue behind
+            self._active_weight = round(self._active_weight - weight, 9) if self._active else 0.0
+            if seconds is not None:
+                self._avg_scrape_seconds = (seconds if self._avg_scrape_seconds is None
+                                            else 0.8 * self._avg_scrape_seconds + 0.2 * seconds)
+            self._cond.notify_all()
+
+    def accepting(self, weight=1.0):
+        """
+        False while the wait queue is full, so a new lease of this weight would be rejected.
+        """
+        with self._cond:
+            return len(self._waiting) < self.max_queued or self._block_reason(weight) is None
+
+    def stats(self):
+        memory = available_memory_mb()
+        load = load_per_cpu()
+        with self._cond:
+            return {
+                **self.counters,
+                'active': self._active,
+                'active_weight': round(self._active_weight, 2),
+                'waiting': len(self._waiting),
+                'max_active': self.max_active,
+                'max_queued': self.max_queued,
+                'available_memory_mb': round(memory) if memory is not None else None,
+                'load_per_cpu': round(load, 2) if load is not None else None,
+                'last_block_reason': self.last_block_reason,
+                'avg_scrape_seconds': round(self._avg_scrape_seconds, 1) if self._avg_scrape_seconds else None,
+            }
@@ -0,0 +1,445 @@
+"""
+Asyncio scraper backend on Playwright: many scrapes in flight in one event loop
+and one Chromium, instead of one thread and one Chrome per scrape.
+
+AsyncScraper.scrape runs the phases of scrape_google_maps_reviews (navigate,
+cookies, overview, reviews tab, sort, scroll, extract) as coroutines, with the
+same in-page function expressions, review selection and records. Every scrape
+gets its own browser context (cookie jar and cache); the consent cookies of the
+first scrape are copied into the following ones. Batches are always extracted
+and pruned while scrolling; lean mode and network extraction are Selenium only.
+
+AsyncScrapeRunner runs the scraper on a background event loop so Flask's worker
+threads and the job queue can call it like the Selenium scraper.
+
+Playwright is optional: pip install playwright && playwright install chromium
+"""
+import asyncio
+import logging
+import os
+import threading
+
+try:
+    from playwright.async_api import async_playwright, Error as PlaywrightError
+except ImportError:
+    async_playwright = None
+    PlaywrightError = Exception
+
+from maps_page import (OVERVIEW_SELECTORS, REVIEWS_TAB_SELECTORS, SORT_BUTTON_SELECTORS, REVIEW_AREA_SELECTORS,
+                       SORT_MENU_OPTIONS, NAVIGATION_READY_SELECTORS, COOKIE_ACCEPT_XPATH, search_url)
+from metrics import timed_events, EARLY_STOPS, REVIEWS_EXTRACTED, SCRAPES, SCROLL_ATTEMPTS, SCROLL_BATCH_SECONDS
+from review_dates import scrape_anchor
+from review_extraction import (EXTRACT_REVIEWS_FN, EXPAND_REVIEWS_FN, READ_REVIEW_TEXTS_FN, PRUNE_REVIEWS_FN,
+                               RATING_HISTOGRAM_FN)
+from scrape_common import emit_event, is_cancelled, business_overview, ReviewSelector, build_review_records
+from scroll_loader import (SCROLL_AND_WAIT_FN, WAIT_FOR_ANY_FN, WAIT_FOR_QUIET_FN, SCROLL_IDLE_TIMEOUT, SETTLE_TIME)
+from sort_strategy import sort_pass, plan_sort_passes
+
+logger = logging.getLogger(__name__)
+
+ASYNC_BACKEND_AVAILABLE = async_playwright is not None
+# "sync" (Selenium driver pool) or "async" (this module), per request through the "backend" option
+SCRAPER_BACKEND = os.environ.get('SCRAPER_BACKEND', 'sync')
+# Scrapes in flight at once in the shared browser (overridable through the environment)
+ASYNC_MAX_PAGES = int(os.environ.get('ASYNC_MAX_PAGES', 16))
+NAVIGATION_TIMEOUT = float(os.environ.get('ASYNC_NAVIGATION_TIMEOUT', 30))
+
+COUNT_REVIEW_NODES_FN = "() => document.querySelectorAll('div[data-review-id]').length"
+
+
+class AsyncScraper:
+    """
+    Scrapes Google Maps reviews with one shared Chromium, at most max_pages at a time.
+    Takes the same place cache, selector registry and seen review store as the Selenium scraper.
+    """
+
+    def __init__(self, place_cache, selector_registry, seen_review_store, max_pages=ASYNC_MAX_PAGES):
+        self.place_cache = place_cache
+        self.selector_registry = selector_registry
+        self.seen_review_store = seen_review_store
+        self.max_pages = max(1, max_pages)
+        self._playwright = None
+        self._browser = None
+        self._storage_state = None
+        # Created on the event loop that runs the scrapes (see _bind_loop), not in the constructing thread
+        self._pages = None
+        self._launch_lock = None
+
+    def _bind_loop(self):
+        # Depending on the Python version asyncio primitives bind to the loop current when
+        # they are created, and the scraper is constructed outside the runner's loop thread.
+        # The loop runs one coroutine at a time, so creating them on first use cannot race.
+        if self._launch_lock is None:
+            self._pages = asyncio.Semaphore(self.max_pages)
+            self._launch_lock = asyncio.Lock()
+
+    async def start(self):
+        """
+        Launch Chromium, or launch it again after it crashed.
+        """
+        if not ASYNC_BACKEND_AVAILABLE:
+            raise RuntimeError("The async backend needs Playwright (pip install playwright)")
+        self._bind_loop()
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(
+                headless=True, args=['--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu'])
+            logger.info("✅ Chromium launched for the async backend")
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def scrape(self, business_name_input, location_input, selected_stars, on_event=None, incremental=False,
+                     cancel_event=None, since=None, **options):
+        """
+        Same arguments, events and records as scrape_google_maps_reviews. The
+        Selenium-only options (lean, extraction, prune_dom) are ignored.
+        """
+        on_event, phase_timer = timed_events(on_event)
+        scrape = _AsyncScrape(self, business_name_input, location_input, selected_stars, on_event, incremental,
+                              cancel_event, since)
+        logger.info(f"Starting async scraping for: {business_name_input} in {location_input}")
+        emit_event(on_event, 'phase', phase='driver')
+        try:
+            await self.start()
+        except Exception as e:
+            logger.error(f"❌ Async browser launch failed: {e}")
+            phase_timer.finish()
+            SCRAPES.inc(outcome='failed')
+            return []
+
+        outcome = 'failed'
+        self._bind_loop()
+        async with self._pages:
+            context = None
+            try:
+                context = await self._browser.new_context(storage_state=self._storage_state,
+                                                          viewport={'width': 1920, 'height': 1080})
+                outcome = await scrape.run(context)
+            except Exception as e:
+                logger.error(f"An unexpected error occurred during the async scraping process: {e}")
+            finally:
+                phase_timer.finish()
+                SCRAPES.inc(outcome=outcome)
+                SCROLL_ATTEMPTS.observe(scrape.scroll_attempts)
+                if context is not None:
+                    try:
+                        await context.close()
+                    except PlaywrightError:
+                        pass
+        return scrape.reviews if outcome != 'failed' else []
+
+
+class _AsyncScrape:
+    """
+    State of one async scrape; run() returns its outcome ('ok', 'cancelled' or 'failed').
+    """
+
+    def __init__(self, scraper, business_name_input, location_input, selected_stars, on_event, incremental,
+                 cancel_event, since):
+        self.scraper = scraper
+        self.registry = scraper.selector_registry
+        self.business_name_input = business_name_input
+        self.location_input = location_input
+        self.selected_stars = selected_stars
+        self.on_event = on_event
+        self.incremental = incremental
+        self.cancel_event = cancel_event
+        self.since = since
+        self.scrape_date = scrape_anchor()
+        self.page = None
+        self.business_data = {}
+        self.base_url = None
+        self.reviews = []
+        self.selector = None
+        self.scroll_attempts = 0
+        self.scroll_batches = 0
+        self.scroll_batch_ms = 0
+        self.last_batch_ids = []
+
+    async def run(self, context):
+        page = self.page = await context.new_page()
+        place = self.scraper.place_cache.get(self.business_name_input, self.location_input)
+        url = search_url(self.business_name_input, self.location_input)
+
+        emit_event(self.on_event, 'phase', phase='navigate')
+        try:
+            await self._open(place['reviews_url'] if place else url)
+        except PlaywrightError as e:
+            logger.error(f"❌ Failed to navigate to Google Maps: {e}")
+            return 'failed'
+
+        if self.scraper._storage_state is None:
+            emit_event(self.on_event, 'phase', phase='cookies')
+            try:
+                await page.locator(f'xpath={COOKIE_ACCEPT_XPATH}').first.click(timeout=3000)
+                logger.info("Accepted cookies.")
+                await page.evaluate(WAIT_FOR_QUIET_FN, {'quiet_ms': 300, 'timeout_ms': 1000})
+            except PlaywrightError:
+                logger.debug("No cookie prompt found or already accepted.")
+            # Later contexts start with these cookies, so the prompt does not come back
+            self.scraper._storage_state = await context.storage_state()
+
+        if is_cancelled(self.cancel_event):
+            logger.info("Scrape cancelled before the reviews were opened.")
+            emit_event(self.on_event, 'summary', cancelled=True)
+            return 'cancelled'
+
+        if place:
+            emit_event(self.on_event, 'phase', phase='reviews_tab')
+            if (await self._wait_for_reviews(3))['count'] or await self._open_reviews_tab():
+                logger.info(f"✅ Opened reviews of cached place: {place['place_url']}")
+                self.base_url = place['place_url']
+                self.business_data = dict(place['business'])
+            else:
+                logger.warning("Cached place did not open its reviews; resolving it through search again.")
+                self.scraper.place_cache.invalidate(self.business_name_input, self.location_input)
+                await self._open(url)
+
+        if self.base_url is None:
+            emit_event(self.on_event, 'phase', phase='overview')
+            found = await self.registry.find_all_async(page, OVERVIEW_SELECTORS, timeout=4)
+            self.business_data = business_overview({group: text for group, (_, text) in found.items()},
+                                                   self.business_name_input,
+                                                   await page.evaluate(RATING_HISTOGRAM_FN) or {})
+            emit_event(self.on_event, 'phase', phase='reviews_tab')
+            if not await self._open_reviews_tab():
+                return 'failed'
+            reviews_url = page.url
+            self.base_url = reviews_url.split('?')[0]
+            self.scraper.place_cache.put(self.business_name_input, self.location_input, self.base_url, reviews_url,
+                                         self.business_data)
+
+        known_review_ids = self.scraper.seen_review_store.load(self.base_url) if self.incremental else set()
+        self.selector = ReviewSelector(known_review_ids, self.since, self.scrape_date, self.cancel_event)
+        if self.incremental or self.since:
+            sort_passes = [sort_pass('newest', self.selected_stars)]
+        else:
+            sort_passes = plan_sort_passes(self.selected_stars, self.business_data.get("Rating Histogram"))
+        logger.info(f"Sort plan: {sort_passes}")
+
+        for current_pass in sort_passes:
+            if is_cancelled(self.cancel_event):
+                break
+            sorted_by_order = False
+            if current_pass['order']:
+                emit_event(self.on_event, 'phase', phase='sort')
+                sorted_by_order = await self._sort(current_pass['order'])
+                if not sorted_by_order and not self.incremental:
+                    current_pass = sort_pass(None, self.selected_stars)
+            self.selector.start_pass(current_pass)
+            if not await self._scroll_and_extract(
+                    early_stop=sorted_by_order and current_pass['order'] in ('lowest', 'highest'),
+                    date_stop=bool(self.since) and sorted_by_order and current_pass['order'] == 'newest'):
+                return 'failed'
+            if current_pass['order'] is None:
+                break
+
+        logger.info(f"Extracted {len(self.reviews)} unique reviews with selected star ratings.")
+        REVIEWS_EXTRACTED.inc(len(self.reviews))
+        page_stats = {'backend': 'async', 'prune_dom': True, 'sort_passes': [item['order'] for item in sort_passes],
+                      'scroll_batches': self.scroll_batches, 'scroll_batch_ms': self.scroll_batch_ms,
+                      'avg_scroll_batch_ms': round(self.scroll_batch_ms / self.scroll_batches, 1)
+                      if self.scroll_batches else None}
+        cancelled = is_cancelled(self.cancel_event)
+        emit_event(self.on_event, 'summary', place_url=self.base_url, business=self.business_data,
+                   cancelled=cancelled, page_stats=page_stats)
+        if self.incremental:
+            # Same rule as the Selenium scraper: a cancelled run does not mark its reviews as seen
+            if cancelled:
+                known_total = len(known_review_ids)
+            else:
+                known_total = self.scraper.seen_review_store.add(self.base_url, self.selector.processed_review_ids)
+            emit_event(self.on_event, 'summary', new_reviews_count=len(self.reviews), known_reviews_total=known_total)
+        emit_event(self.on_event, 'phase', phase='done')
+        return 'cancelled' if cancelled else 'ok'
+
+    async def _open(self, url):
+        await self.page.goto(url, wait_until='domcontentloaded', timeout=NAVIGATION_TIMEOUT * 1000)
+        await self.page.evaluate(WAIT_FOR_ANY_FN, {'selectors': NAVIGATION_READY_SELECTORS, 'timeout_ms': 4000})
+
+    async def _wait_for_reviews(self, timeout, previous_count=0, scroll_element=None):
+        return await self.page.evaluate(SCROLL_AND_WAIT_FN, {
+            'scroll_element': scroll_element,
+            'previous_count': previous_count,
+            'idle_ms': int(timeout * 1000),
+            'settle_ms': int(SETTLE_TIME * 1000),
+        })
+
+    async def _find(self, name, candidates, timeout, visible=False):
+        return (await self.registry.find_all_async(self.page, {name: (candidates, visible)}, timeout))[name][0]
+
+    async def _open_reviews_tab(self):
+        try:
+            review_button = await self._find('reviews_tab', REVIEWS_TAB_SELECTORS, timeout=3, visible=True)
+            if review_button is None:
+                logger.warning("Could not find or click the Reviews button/tab.")
+                return False
+            await review_button.click(timeout=3000)
+            await self._wait_for_reviews(3)
+            return True
+        except PlaywrightError as e:
+            logger.warning(f"Error clicking reviews tab: {e}")
+            return False
+
+    async def _sort(self, sort_order):
+        try:
+            sort_button = await self._find('sort_button', SORT_BUTTON_SELECTORS, timeout=3, visible=True)
+            if sort_button is None:
+                logger.warning("Could not find sort button with any selector")
+                return False
+            await sort_button.click(timeout=3000)
+            await self.page.locator(f'xpath=//*[@id="action-menu"]/div[{SORT_MENU_OPTIONS[sort_order]}]').click(
+                timeout=4000)
+            logger.info(f"Selected '{sort_order}' sort option.")
+            await self.page.evaluate(WAIT_FOR_QUIET_FN, {'quiet_ms': 300, 'timeout_ms': 3000})
+            return True
+        except PlaywrightError as e:
+            logger.warning(f"Could not sort by '{sort_order}' (will continue with default sorting): {e}")
+            return False
+
+    async def _add_records(self, selected_raw_reviews):
+        expanded_texts = {}
+        review_ids = [raw['review_id'] for raw, _, _ in selected_raw_reviews if raw['has_more']]
+        if review_ids:
+            try:
+                if await self.page.evaluate(EXPAND_REVIEWS_FN, review_ids):
+                    await asyncio.sleep(0.5)
+                expanded_texts = await self.page.evaluate(READ_REVIEW_TEXTS_FN, review_ids)
+            except PlaywrightError as e:
+                logger.warning(f"Could not expand truncated reviews: {e}")
+        for record in build_review_records(selected_raw_reviews, expanded_texts, self.business_data, self.base_url,
+                                           self.scrape_date):
+            self.reviews.append(record)
+            emit_event(self.on_event, 'review', review=record)
+
+    async def _extract_and_prune(self, prune=True):
+        """
+        Extract the reviews that are not pruned yet and empty their nodes.
+        Returns the review node count afterwards.
+        """
+        batch = (await self.page.evaluate(EXTRACT_REVIEWS_FN, {'unpruned_only': True}))['reviews']
+        self.last_batch_ids = [raw['review_id'] for raw in batch]
+        await self._add_records(self.selector.select(batch))
+        if prune and self.last_batch_ids:
+            await self.page.evaluate(PRUNE_REVIEWS_FN, self.last_batch_ids)
+        return await self.page.evaluate(COUNT_REVIEW_NODES_FN)
+
+    async def _scroll_and_extract(self, early_stop, date_stop):
+        """
+        Scroll through the reviews in the current order, extracting every batch as it loads.
+        Returns False when the review list could not be found.
+        """
+        emit_event(self.on_event, 'phase', phase='scroll')
+        try:
+            review_area = await self._find('review_area', REVIEW_AREA_SELECTORS, timeout=4)
+            if review_area is None:
+                logger.warning("Could not find the scrollable review area.")
+                return False
+            review_area = await review_area.element_handle(timeout=3000)
+
+            max_scroll_attempts = 100 if not early_stop else 50
+            stop_after_idle_seconds = 6 if early_stop else 10
+            loop = asyncio.get_running_loop()
+            last_new_reviews_at = loop.time()
+            previous_reviews_count = -1
+            current_reviews_count = await self._extract_and_prune()
+            for attempt in range(max_scroll_attempts):
+                if is_cancelled(self.cancel_event):
+                    logger.info(f"Scrape cancelled during scrolling ({current_reviews_count} reviews loaded).")
+                    EARLY_STOPS.inc(reason='cancelled')
+                    break
+                self.scroll_attempts += 1
+                emit_event(self.on_event, 'scroll', attempt=attempt + 1, max_attempts=max_scroll_attempts,
+                           reviews_loaded=current_reviews_count)
+
+                if early_stop and self.selector.extraction_stopped:
+                    logger.info(f"Early stop triggered! Found ratings outside {self.selector.current_pass['stars']}.")
+                    EARLY_STOPS.inc(reason='rating')
+                    break
+                if date_stop and self.selector.date_cutoff_reached:
+                    logger.info(f"Date cutoff {self.since} reached. Stopping scroll.")
+                    EARLY_STOPS.inc(reason='date')
+                    break
+                if current_reviews_count == previous_reviews_count:
+                    if loop.time() - last_new_reviews_at >= stop_after_idle_seconds:
+                        logger.info(f"No new reviews found. Assuming all loaded ({current_reviews_count} total).")
+                        break
+                else:
+                    last_new_reviews_at = loop.time()
+                    # Incremental mode: stop as soon as a whole new batch is already known
+                    known_review_ids = self.selector.known_review_ids
+                    if (self.incremental and known_review_ids and self.last_batch_ids
+                            and all(review_id in known_review_ids for review_id in self.last_batch_ids)):
+                        logger.info(f"Incremental stop: all {len(self.last_batch_ids)} reviews of the latest batch "
+                                    f"are already known.")
+                        EARLY_STOPS.inc(reason='incremental')
+                        break
+
+                previous_reviews_count = current_reviews_count
+                scroll_result = await self._wait_for_reviews(SCROLL_IDLE_TIMEOUT, previous_reviews_count,
+                                                             scroll_element=review_area)
+                current_reviews_count = scroll_result['count']
+                self.scroll_batches += 1
+                self.scroll_batch_ms += scroll_result['elapsed_ms']
+                SCROLL_BATCH_SECONDS.observe(scroll_result['elapsed_ms'] / 1000)
+                if current_reviews_count > previous_reviews_count:
+                    current_reviews_count = await self._extract_and_prune()
+        except PlaywrightError as e:
+            logger.warning(f"Error during scrolling: {e}. Proceeding with currently loaded reviews.")
+
+        emit_event(self.on_event, 'phase', phase='extract')
+        if not self.selector.extraction_stopped:
+            await self._extract_and_prune(prune=False)
+        return True
+
+
+class AsyncScrapeRunner:
+    """
+    Runs an AsyncScraper on an event loop in a background thread. scrape() blocks
+    the calling thread only, with the same signature as scrape_google_maps_reviews,
+    so it plugs into scrape_and_store, the result cache and the job queue.
+    Event callbacks are called from the loop thread.
+    """
+
+    def __init__(self, scraper):
+        self.scraper = scraper
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='async-scraper', daemon=True).start()
+            return self._loop
+
+    def submit(self, business_name, location, selected_stars, on_event=None, **options):
+        """
+        Start a scrape on the loop; returns a concurrent.futures.Future with its reviews.
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.scraper.scrape(business_name, location, selected_stars, on_event=on_event, **options),
+            self._ensure_loop())
+
+    def scrape(self, business_name, location, selected_stars, on_event=None, **options):
+        return self.submit(business_name, location, selected_stars, on_event=on_event, **options).result()
+
+    def shutdown(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.scraper.close(), loop).result(timeout=10)
+        except Exception as e:
+            logger.warning(f"Could not close the async browser: {e}")
+        loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,263 @@
+"""
+Batch scraping of many businesses with parallel browser workers.
+
+Usage:
+    python -m batch input.csv --output results.jsonl --workers 4 [--tabs 3]
+
+The input is a CSV (columns business_name, location, stars) or a JSONL file
+(keys business_name, location, selected_stars). Every worker is a separate
+process with its own Chrome; with --tabs each Chrome scrapes several businesses
+at once in separate tabs. The parent process sweeps for orphaned Chrome
+processes and, when run from the web app, holds one admission slot per worker. Finished rows are checkpointed next to the output
+file, so an interrupted run picks up where it stopped.
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from exporters import EXPORT_COLUMNS
+from jobs import job_key
+from logging_setup import configure_logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = int(os.environ.get('BATCH_WORKERS', 2))
+DEFAULT_TABS = int(os.environ.get('BATCH_TABS', 1))
+DEFAULT_STARS = [1, 2, 3]
+
+
+def parse_stars(value):
+    if value is None or value == '':
+        return list(DEFAULT_STARS)
+    if isinstance(value, (list, tuple)):
+        return [int(star) for star in value]
+    return [int(star) for star in str(value).replace(' ', ',').split(',') if star.strip()]
+
+
+def normalize_batch_rows(items):
+    """
+    Turn input dicts into (business_name, location, selected_stars) rows,
+    skipping rows without a business name or location.
+    """
+    rows = []
+    for item in items:
+        business_name = (item.get('business_name') or item.get('business') or '').strip()
+        location = (item.get('location') or '').strip()
+        if not business_name or not location:
+            continue
+        rows.append({
+            'business_name': business_name,
+            'location': location,
+            'selected_stars': parse_stars(item.get('selected_stars', item.get('stars'))),
+        })
+    return rows
+
+
+def read_batch_rows(path):
+    """
+    Read batch rows from a CSV or JSONL file.
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith('.jsonl') or path.endswith('.ndjson'):
+            return normalize_batch_rows(json.loads(line) for line in f if line.strip())
+        return normalize_batch_rows(csv.DictReader(f))
+
+
+def row_checkpoint_key(row):
+    return json.dumps(job_key(row['business_name'], row['location'], row['selected_stars']))
+
+
+def checkpoint_path(output_path):
+    return f'{output_path}.checkpoint'
+
+
+def load_checkpoint(output_path):
+    try:
+        with open(checkpoint_path(output_path), encoding='utf-8') as f:
+            return {line.rstrip('\n') for line in f if line.strip()}
+    except OSError:
+        return set()
+
+
+def _init_worker(tabs=1):
+    # One warm Chrome per worker process, launched on first use
+    from scraper import init_scraper
+
+    configure_logging()
+    init_scraper(pool_size=1, prewarm=False, tabs_per_browser=tabs, reap_orphans=False)
+
+
+def _summary_collector(summary):
+    def collect_summary(event):
+        if event['type'] == 'summary':
+            summary.update(event)
+    return collect_summary
+
+
+def _row_result(row, reviews, summary, started_at, error=None):
+    duration = round(time.time() - started_at, 1)
+    if error is None and not summary.get('place_url'):
+        # The scraper returns an empty list when a phase fails; do not checkpoint those rows
+        error = 'Scrape did not reach the reviews of this business'
+    if error is not None:
+        return {**row, 'status': 'failed', 'error': error, 'reviews_count': 0, 'reviews': [], 'duration': duration}
+    return {**row, 'status': 'finished', 'reviews_count': len(reviews), 'reviews': reviews,
+            'business_id': summary.get('business_id'), 'duration': duration}
+
+
+def _scrape_row(row):
+    from scraper import scrape_and_store
+
+    started_at = time.time()
+    summary = {}
+    try:
+        reviews = scrape_and_store(row['business_name'], row['location'], row['selected_stars'],
+                                   on_event=_summary_collector(summary))
+        return _row_result(row, reviews, summary, started_at)
+    except Exception as e:
+        return _row_result(row, [], summary, started_at, error=str(e))
+
+
+def _scrape_rows(rows):
+    """
+    Scrape a group of rows. Several rows share the worker's Chrome, one tab each
+    (durations are then those of the whole group).
+    """
+    if len(rows) == 1:
+        return [_scrape_row(rows[0])]
+
+    import scraper
+
+    started_at = time.time()
+    summaries = [{} for _ in rows]
+    scrapes = [{'business_name': row['business_name'], 'location': row['location'],
+                'selected_stars': row['selected_stars'], 'on_event': _summary_collector(summary)}
+               for row, summary in zip(rows, summaries)]
+    try:
+        results = scraper.tab_scheduler.run(scrapes)
+    except Exception as e:
+        return [_row_result(row, [], summary, started_at, error=str(e)) for row, summary in zip(rows, summaries)]
+    return [_row_result(row, reviews, summary, started_at)
+            for row, reviews, summary in zip(rows, results, summaries)]
+
+
+class BatchOutput:
+    """
+    Appends finished rows to the output file (JSONL, or review rows for .csv) and the checkpoint.
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.is_csv = output_path.endswith('.csv')
+        write_header = self.is_csv and not os.path.exists(output_path)
+        self._output = open(output_path, 'a', encoding='utf-8', newline='')
+        self._checkpoint = open(checkpoint_path(output_path), 'a', encoding='utf-8')
+        if self.is_csv:
+            self._csv = csv.writer(self._output)
+            if write_header:
+                self._csv.writerow(['Input Business', 'Input Location'] + EXPORT_COLUMNS)
+
+    def write(self, result):
+        if self.is_csv:
+            for record in result['reviews']:
+                self._csv.writerow([result['business_name'], result['location']] +
+                                   [record.get(column, "") for column in EXPORT_COLUMNS])
+        else:
+            self._output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self._output.flush()
+        # Failed rows are not checkpointed, so a resumed run retries them
+        if result['status'] == 'finished':
+            self._checkpoint.write(row_checkpoint_key(result) + '\n')
+            self._checkpoint.flush()
+
+    def close(self):
+        self._output.close()
+        self._checkpoint.close()
+
+
+def run_batch(rows, output_path, workers=DEFAULT_WORKERS, resume=True, on_progress=None, tabs=DEFAULT_TABS,
+              admission=None):
+    """
+    Scrape all rows with `workers` browser processes, writing results as they finish.
+    With tabs > 1 every browser scrapes that many rows at once in separate tabs.
+    The workers only admit their own browser, so a caller that also runs scrapes
+    passes its AdmissionController: the run waits for and holds `workers` slots of it.
+    Returns a summary dict with total, skipped, finished and failed counts.
+    """
+    workers = max(1, workers)
+    tabs = max(1, tabs)
+    if not resume:
+        for path in (output_path, checkpoint_path(output_path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    done_keys = load_checkpoint(output_path) if resume else set()
+    pending, seen = [], set(done_keys)
+    for row in rows:
+        key = row_checkpoint_key(row)
+        if key not in seen:
+            seen.add(key)
+            pending.append(row)
+
+    summary = {'total': len(rows), 'skipped': len(rows) - len(pending), 'finished': 0, 'failed': 0}
+    logger.info(f"Batch: {len(pending)} rows to scrape, {summary['skipped']} already done or duplicated, "
+                f"{workers} workers x {tabs} tabs")
+    if on_progress:
+        on_progress(dict(summary))
+    if not pending:
+        return summary
+
+    if admission is not None:
+        admission.acquire(timeout=None, weight=workers)
+    output = BatchOutput(output_path)
+    context = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(tabs,)) as executor:
+            futures = [executor.submit(_scrape_rows, pending[start:start + tabs])
+                       for start in range(0, len(pending), tabs)]
+            for future in as_completed(futures):
+                for result in future.result():
+                    output.write(result)
+                    summary[result['status']] += 1
+                    log = logger.info if result['status'] == 'finished' else logger.warning
+                    log(f"Batch: {result['business_name']} ({result['location']}) {result['status']}, "
+                        f"{result['reviews_count']} reviews in {result['duration']}s")
+                if on_progress:
+                    on_progress(dict(summary))
+    finally:
+        output.close()
+        if admission is not None:
+            admission.release(weight=workers)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scrape Google Maps reviews for many businesses in parallel.')
+    parser.add_argument('input', help='CSV (business_name, location, stars) or JSONL input file')
+    parser.add_argument('--output', '-o', help='Output file (.jsonl or .csv), default: <input>.results.jsonl')
+    parser.add_argument('--workers', '-w', type=int, default=DEFAULT_WORKERS, help='Number of browser processes')
+    parser.add_argument('--tabs', '-t', type=int, default=DEFAULT_TABS,
+                        help='Businesses scraped at once in the tabs of each browser')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from scratch')
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    # The workers do not sweep for orphaned Chrome processes themselves
+    from driver_pool import start_orphan_reaper
+    start_orphan_reaper()
+    output_path = args.output or f'{os.path.splitext(args.input)[0]}.results.jsonl'
+    rows = read_batch_rows(args.input)
+    summary = run_batch(rows, output_path, workers=args.workers, resume=not args.restart, tabs=args.tabs)
+    logger.info(f"Batch finished: {summary}")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
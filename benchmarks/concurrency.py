@@ -0,0 +1,163 @@
+"""
+Selenium driver pool vs asyncio backend with many scrapes in flight, against
+the offline fixtures.
+
+Usage:
+    python -m benchmarks.concurrency [--scrapes N] [--concurrency N] [--backend sync|async|both]
+                                     [--json results.json]
+
+The same list of fixture scrapes (the cases of benchmarks/run.py, repeated up to
+--scrapes) runs on each backend, --concurrency at a time: the sync backend with
+one thread and one pooled Chrome per concurrent scrape, the async backend with
+one event loop and a page per scrape in one Chromium. Every result is checked
+against its fixture. Wall time, reviews/sec and the peak RSS of this process and
+its browsers are reported per backend. The async backend needs Playwright.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fixture_server import FixtureServer, load_fixture
+from benchmarks.run import CASES, LOCATION, MAX_PRINTED_PROBLEMS, expected_reviews, compare_reviews
+
+
+class RssSampler:
+    """
+    Samples the resident memory of this process and all its children (drivers and browsers).
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_mb = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        from driver_pool import _process_tree_rss_mb
+
+        def sample():
+            while not self._stop.is_set():
+                self.peak_mb = max(self.peak_mb, _process_tree_rss_mb(os.getpid()))
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_sync(scraper, scrapes, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(scraper.scrape_google_maps_reviews, fixture_name, LOCATION, selected_stars,
+                                   extraction='dom')
+                   for fixture_name, selected_stars in scrapes]
+        return [future.result() for future in futures]
+
+
+def run_async(scraper, scrapes, concurrency):
+    from async_scraper import AsyncScraper
+
+    async def scrape_all():
+        async_scraper = AsyncScraper(scraper.place_cache, scraper.selector_registry, scraper.seen_review_store,
+                                     max_pages=concurrency)
+        try:
+            return await asyncio.gather(*[async_scraper.scrape(fixture_name, LOCATION, selected_stars)
+                                          for fixture_name, selected_stars in scrapes])
+        finally:
+            await async_scraper.close()
+
+    return asyncio.run(scrape_all())
+
+
+BACKENDS = {'sync': run_sync, 'async': run_async}
+
+
+def run_backend(scraper, backend, scrapes, concurrency, base_url):
+    # Every backend resolves the places through search, as on a cold start
+    for fixture_name, _ in scrapes:
+        scraper.place_cache.invalidate(fixture_name, LOCATION)
+
+    with RssSampler() as sampler:
+        started = time.perf_counter()
+        results = BACKENDS[backend](scraper, scrapes, concurrency)
+        seconds = time.perf_counter() - started
+
+    problems = []
+    for (fixture_name, selected_stars), reviews in zip(scrapes, results):
+        expected = expected_reviews(fixture_name, load_fixture(fixture_name), selected_stars, base_url, 'dom')
+        problems.extend(f"{fixture_name} {selected_stars}: {problem}"
+                        for problem in compare_reviews(expected, reviews))
+    reviews_count = sum(len(reviews) for reviews in results)
+    return {
+        'backend': backend,
+        'scrapes': len(scrapes),
+        'concurrency': concurrency,
+        'ok': not problems,
+        'seconds': round(seconds, 3),
+        'reviews': reviews_count,
+        'reviews_per_sec': round(reviews_count / seconds, 1) if seconds else None,
+        'peak_rss_mb': round(sampler.peak_mb),
+        'problems': problems,
+    }
+
+
+def print_result(result):
+    status = 'ok  ' if result['ok'] else 'FAIL'
+    print(f"{status} {result['backend']:<6} {result['scrapes']} scrapes x{result['concurrency']:<3} "
+          f"{result['seconds']:>7.2f}s {result['reviews']:>5} reviews {result['reviews_per_sec'] or 0:>7.1f}/s "
+          f"peak RSS {result['peak_rss_mb']} MB")
+    for problem in result['problems'][:MAX_PRINTED_PROBLEMS]:
+        print(f"       ❌ {problem}")
+    if len(result['problems']) > MAX_PRINTED_PROBLEMS:
+        print(f"       ❌ ... and {len(result['problems']) - MAX_PRINTED_PROBLEMS} more differences")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the sync and async scraper backends under concurrency.")
+    parser.add_argument('--scrapes', type=int, default=len(CASES), help="Number of fixture scrapes per backend")
+    parser.add_argument('--concurrency', type=int, default=4, help="Scrapes in flight at once")
+    parser.add_argument('--backend', choices=('sync', 'async', 'both'), default='both')
+    parser.add_argument('--json', help="Write the results to this file")
+    args = parser.parse_args(argv)
+
+    scrapes = [CASES[index % len(CASES)] for index in range(args.scrapes)]
+    # Async first: the pooled Chrome drivers of the sync run stay alive until the end
+    backends = ['async', 'sync'] if args.backend == 'both' else [args.backend]
+    concurrency = max(1, args.concurrency)
+
+    with FixtureServer() as server:
+        # Configure the scraper before it is imported: isolated data, one driver per concurrent scrape, local Maps
+        os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='scraper-benchmark-')
+        os.environ['CHROME_POOL_SIZE'] = str(concurrency)
+        os.environ['CHROME_POOL_PREWARM'] = '0'
+        os.environ['MAPS_BASE_URL'] = server.base_url
+        import scraper
+        scraper.init_scraper()
+
+        print(f"Fixtures served from {server.base_url}, {len(scrapes)} scrapes, {concurrency} at a time")
+        results = []
+        try:
+            for backend in backends:
+                result = run_backend(scraper, backend, scrapes, concurrency, server.base_url)
+                print_result(result)
+                results.append(result)
+        finally:
+            scraper.driver_pool.shutdown()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'results': results}, f, ensure_ascii=False, indent=2)
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
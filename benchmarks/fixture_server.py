@@ -0,0 +1,195 @@
+"""
+Local stand-in for the parts of Google Maps the scraper talks to.
+
+Every fixture in benchmarks/fixtures/<name>.json describes one place and its
+reviews. The server renders them into the markup the extractors read (place
+panel, Reviews tab, Sort menu and review nodes in star or "x/5" format) and
+answers the review list requests with listugcposts-shaped payloads, so the DOM
+and the network extraction strategies both run against it. Nothing is fetched
+from outside 127.0.0.1.
+"""
+import html
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote_plus, urlsplit
+
+from network_capture import XSSI_PREFIX
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PAGE_PATH = os.path.join(FIXTURE_DIR, 'maps.html')
+# Reviews per list request, like Maps
+PAGE_SIZE = 10
+# Characters shown before the "See more" button of a truncated review
+TRUNCATE_AT = 120
+
+LABELS = {
+    'en': {'star': 'star', 'stars': 'stars', 'reviews': 'reviews', 'reviews_for': 'Reviews for', 'tab': 'Reviews',
+           'on': 'on', 'accept': 'Accept all'},
+    'de': {'star': 'Stern', 'stars': 'Sterne', 'reviews': 'Rezensionen', 'reviews_for': 'Rezensionen für',
+           'tab': 'Rezensionen', 'on': 'bei', 'accept': 'Alle akzeptieren'},
+}
+# Review order per option of the Sort menu; ties keep the fixture order
+SORT_KEYS = {
+    'relevant': None,
+    'newest': lambda review: review['age_days'],
+    'highest': lambda review: -review['rating'],
+    'lowest': lambda review: review['rating'],
+}
+
+
+def fixture_names():
+    return sorted(name[:-len('.json')] for name in os.listdir(FIXTURE_DIR) if name.endswith('.json'))
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, f'{name}.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def ordered_reviews(fixture, order):
+    key = SORT_KEYS.get(order)
+    return sorted(fixture['reviews'], key=key) if key else list(fixture['reviews'])
+
+
+def rating_histogram(fixture):
+    counts = {rating: 0 for rating in range(1, 6)}
+    for review in fixture['reviews']:
+        counts[review['rating']] += 1
+    return counts
+
+
+def render_place(fixture):
+    """
+    Place panel: name, average rating, review count, histogram and the Reviews tab.
+    """
+    labels = LABELS[fixture['locale']]
+    name = html.escape(fixture['business'])
+    total = len(fixture['reviews'])
+    rows = ''.join(
+        f'<tr aria-label="{rating} {labels["star"] if rating == 1 else labels["stars"]}, {count} {labels["reviews"]}">'
+        f'<td>{rating}</td></tr>'
+        for rating, count in sorted(rating_histogram(fixture).items(), reverse=True)
+    )
+    return (
+        f'<h1 class="DUwDvf">{name}</h1>'
+        f'<div class="F7nice"><span><span aria-hidden="true">{fixture["average_rating"]}</span></span>'
+        f'<span><span aria-label="{total} {labels["reviews"]}">({total})</span></span></div>'
+        f'<table><tbody>{rows}</tbody></table>'
+        f'<button role="tab" aria-label="{labels["reviews_for"]} {name}">{labels["tab"]}</button>'
+    )
+
+
+def render_review(review, locale):
+    """
+    One review node. Star reviews carry an aria-label and a separate date span;
+    "x/5" reviews have rating, date and source in one DU9Pgb line like
+    "4/5 2 weeks ago on Tripadvisor".
+    """
+    labels = LABELS[locale]
+    rating = review['rating']
+    if review['format'] == 'slash':
+        meta = (f'<div class="DU9Pgb"><span class="fzvQIb">{rating}/5</span> '
+                f'<span class="xRkPPb">{review["date"]} {labels["on"]} {review["source"]}</span></div>')
+    else:
+        meta = (f'<span class="kvMYJc" role="img" aria-label="{rating} {labels["star"] if rating == 1 else labels["stars"]}">'
+                f'</span><span class="rsqaWe">{review["date"]}</span>')
+    text = review['text']
+    more = ''
+    if review['truncate'] and len(text) > TRUNCATE_AT:
+        text = text[:TRUNCATE_AT].rstrip() + '…'
+        more = '<button class="w8nwRe kyuRq" aria-label="See more">More</button>'
+    return (
+        f'<div class="jftiEf fontBodyMedium" data-review-id="{review["id"]}">'
+        f'<div class="d4r55">{html.escape(review["reviewer"])}</div>{meta}'
+        f'<div class="MyEned"><span class="wiI7pd">{html.escape(text)}</span>{more}</div>'
+        f'</div>'
+    )
+
+
+def review_payload(reviews, locale):
+    """
+    A listugcposts response: the review data at data[2] (the layout parse_review_payload
+    reads) and, at data[3], the markup of the same reviews for the page to render.
+    Reviews from other sources only exist in the rendered list, as on Maps.
+    """
+    entries = []
+    for review in reviews:
+        if review['source'] != 'Google':
+            continue
+        author = [None] * 5 + [[review['reviewer']]]
+        meta = [None, None, None, None, author, None, review['date']]
+        body = [[review['rating']]] + [None] * 14 + [[[review['text']]]]
+        entries.append([[review['id'], meta, body]])
+    data = [None, None, entries, [render_review(review, locale) for review in reviews]]
+    return XSSI_PREFIX + '\n' + json.dumps(data, ensure_ascii=False)
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """
+    /maps/...                      the Maps page (maps.html), for search and place URLs
+    /fixture/<name>/place          place panel markup and review text lookups
+    /maps/rpc/listugcposts?...     one page of reviews in the requested order
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path.startswith('/maps/rpc/listugcposts'):
+                fixture = load_fixture(query['fixture'])
+                page = int(query.get('page', 0))
+                reviews = ordered_reviews(fixture, query.get('order', 'relevant'))
+                self.respond(review_payload(reviews[page * PAGE_SIZE:(page + 1) * PAGE_SIZE], fixture['locale']),
+                             'application/json')
+            elif url.path.startswith('/fixture/'):
+                name = unquote_plus(url.path.split('/')[2])
+                fixture = load_fixture(name)
+                self.respond(json.dumps({
+                    'locale': fixture['locale'],
+                    'place': render_place(fixture),
+                    'accept': LABELS[fixture['locale']]['accept'],
+                    'texts': {review['id']: review['text'] for review in fixture['reviews']},
+                }, ensure_ascii=False), 'application/json')
+            elif url.path.startswith('/maps/'):
+                with open(PAGE_PATH, encoding='utf-8') as f:
+                    self.respond(f.read(), 'text/html')
+            else:
+                self.send_error(404)
+        except (OSError, KeyError, ValueError) as e:
+            self.send_error(404, str(e))
+
+    def respond(self, body, content_type):
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """
+    Serves the fixtures on 127.0.0.1 from a background thread.
+    """
+
+    def __init__(self, port=0):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), FixtureRequestHandler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,253 @@
+"""
+Offline benchmark and regression suite for scrape_google_maps_reviews.
+
+Usage:
+    python -m benchmarks.run [--extraction dom|network] [--lean] [--prune-dom] [--repeat N]
+                             [--fixture NAME ...] [--json results.json]
+
+Every case scrapes one fixture place (see benchmarks/fixture_server.py) with
+headless Chrome against a local server and checks each extracted field against
+the fixture. Wall time, WebDriver round-trips and reviews/sec are reported per
+scrape phase. The exit status is 1 when any field differs from the fixture.
+No network access is needed apart from 127.0.0.1 (chromedriver must be installed).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+from benchmarks.fixture_server import FixtureServer, fixture_names, load_fixture
+
+# (fixture, selected stars): a default-order scan, lowest/highest sorted passes and a two-pass split
+CASES = [
+    ('en_stars', [1, 2, 3, 4, 5]),
+    ('en_stars', [1, 2]),
+    ('en_stars', [5]),
+    ('en_stars', [1, 5]),
+    ('de_stars', [1, 2, 3]),
+    ('de_stars', [4, 5]),
+    ('mixed_sources', [1, 2, 3, 4, 5]),
+    ('mixed_sources', [1, 2]),
+    ('mixed_sources_de', [1, 2, 3, 4, 5]),
+    ('see_more', [1, 2, 3, 4, 5]),
+]
+LOCATION = 'Benchmark'
+COMPARED_FIELDS = ("Business Name", "Average Rating", "Total Reviews", "Reviewer", "Rating", "Reviewed On",
+                   "Review Text", "Review Link")
+# Field differences printed per case before the rest is summarized
+MAX_PRINTED_PROBLEMS = 10
+
+
+class RoundTripCounter:
+    """
+    Counts WebDriver commands (execute_script, clicks, CDP calls, log reads, ...)
+    by wrapping WebDriver.execute, which every command goes through.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def install(self):
+        from selenium.webdriver.remote.webdriver import WebDriver
+        original_execute = WebDriver.execute
+        counter = self
+
+        def execute(driver, driver_command, params=None):
+            counter.count += 1
+            return original_execute(driver, driver_command, params)
+
+        WebDriver.execute = execute
+
+
+def expected_reviews(fixture_name, fixture, selected_stars, base_url, extraction):
+    """
+    The records a correct scrape returns, by review id: Google reviews with a
+    selected rating. The network payload has no "x/5" format, so with network
+    extraction every rating reads "N stars".
+    """
+    place_url = f"{base_url}/maps/place/{quote(fixture_name)}/data=!4m7!3m6!9m1!1b1"
+    expected = {}
+    for review in fixture['reviews']:
+        if review['rating'] not in selected_stars or review['source'] != 'Google':
+            continue
+        if review['format'] == 'slash' and extraction != 'network':
+            rating = f"{review['rating']}/5"
+        else:
+            rating = f"{review['rating']} stars"
+        expected[review['id']] = {
+            "Business Name": fixture['business'],
+            "Average Rating": fixture['average_rating'],
+            "Total Reviews": f"({len(fixture['reviews'])})",
+            "Reviewer": review['reviewer'],
+            "Rating": rating,
+            "Reviewed On": review['date'],
+            "Review Text": review['text'],
+            "Review Link": f"{place_url}?hl=en&review={review['id']}",
+        }
+    return expected
+
+
+def compare_reviews(expected, reviews):
+    """
+    Returns a list of differences between the expected and the scraped records.
+    """
+    problems = []
+    scraped = {}
+    for record in reviews:
+        review_id = record.get("Review Link", "").rsplit('review=', 1)[-1]
+        if review_id in scraped:
+            problems.append(f"{review_id}: extracted twice")
+        scraped[review_id] = record
+    for review_id, want in expected.items():
+        got = scraped.pop(review_id, None)
+        if got is None:
+            problems.append(f"{review_id}: missing")
+            continue
+        for field in COMPARED_FIELDS:
+            if got.get(field) != want[field]:
+                problems.append(f"{review_id}: {field} {got.get(field)!r}, expected {want[field]!r}")
+    for review_id in scraped:
+        problems.append(f"{review_id}: not expected for this star selection or source")
+    return problems
+
+
+class PhaseTimer:
+    """
+    Event callback that splits a scrape into its phases and records wall time,
+    round-trips and extracted reviews per phase.
+    """
+
+    def __init__(self, counter):
+        self.counter = counter
+        self.phases = []
+        self.summary = {}
+        self._current = None
+
+    def _open(self, name):
+        self._close()
+        self._current = {'phase': name, 'started': time.perf_counter(), 'commands_at_start': self.counter.count,
+                         'reviews': 0}
+
+    def _close(self):
+        current = self._current
+        if current is None:
+            return
+        seconds = time.perf_counter() - current.pop('started')
+        current['seconds'] = round(seconds, 3)
+        current['round_trips'] = self.counter.count - current.pop('commands_at_start')
+        current['reviews_per_sec'] = round(current['reviews'] / seconds, 1) if current['reviews'] and seconds else None
+        self.phases.append(current)
+        self._current = None
+
+    def __call__(self, event):
+        if event['type'] == 'phase':
+            if event['phase'] == 'done':
+                self._close()
+            else:
+                self._open(event['phase'])
+        elif event['type'] == 'review' and self._current is not None:
+            self._current['reviews'] += 1
+        elif event['type'] == 'summary':
+            self.summary.update(event)
+
+    def finish(self):
+        self._close()
+        return self.phases
+
+
+def run_case(scrape, counter, base_url, fixture_name, selected_stars, options):
+    fixture = load_fixture(fixture_name)
+    timer = PhaseTimer(counter)
+    commands_before = counter.count
+    started = time.perf_counter()
+    reviews = scrape(fixture_name, LOCATION, selected_stars, on_event=timer, **options)
+    seconds = time.perf_counter() - started
+    phases = timer.finish()
+
+    expected = expected_reviews(fixture_name, fixture, selected_stars, base_url, options['extraction'])
+    problems = compare_reviews(expected, reviews)
+    return {
+        'fixture': fixture_name,
+        'stars': selected_stars,
+        'ok': not problems,
+        'seconds': round(seconds, 3),
+        'round_trips': counter.count - commands_before,
+        'reviews': len(reviews),
+        'expected_reviews': len(expected),
+        'reviews_per_sec': round(len(reviews) / seconds, 1) if seconds else None,
+        'sort_passes': timer.summary.get('page_stats', {}).get('sort_passes'),
+        'phases': phases,
+        'problems': problems,
+    }
+
+
+def print_result(result):
+    status = 'ok  ' if result['ok'] else 'FAIL'
+    print(f"{status} {result['fixture']:<18} stars={','.join(map(str, result['stars'])):<10} "
+          f"{result['seconds']:>7.2f}s {result['round_trips']:>5} round-trips "
+          f"{result['reviews']:>3}/{result['expected_reviews']:<3} reviews {result['reviews_per_sec'] or 0:>6.1f}/s "
+          f"passes={result['sort_passes']}")
+    for phase in result['phases']:
+        rate = f"{phase['reviews_per_sec']:>6.1f} reviews/s" if phase['reviews_per_sec'] else ''
+        print(f"       {phase['phase']:<12} {phase['seconds']:>7.3f}s {phase['round_trips']:>5} round-trips {rate}")
+    for problem in result['problems'][:MAX_PRINTED_PROBLEMS]:
+        print(f"       ❌ {problem}")
+    if len(result['problems']) > MAX_PRINTED_PROBLEMS:
+        print(f"       ❌ ... and {len(result['problems']) - MAX_PRINTED_PROBLEMS} more differences")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline scrape benchmark against saved review fixtures.")
+    parser.add_argument('--extraction', choices=('dom', 'network'), default='dom')
+    parser.add_argument('--lean', action='store_true', help="Run the scrapes in lean mode")
+    parser.add_argument('--prune-dom', action='store_true', help="Extract and prune every batch while scrolling")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="Run every case this many times (repeats open the place from the place cache)")
+    parser.add_argument('--fixture', action='append', choices=fixture_names(), help="Only run cases of this fixture")
+    parser.add_argument('--json', help="Write the results to this file")
+    args = parser.parse_args(argv)
+
+    with FixtureServer() as server:
+        # Configure the scraper before it is imported: isolated data files, one lazily launched driver, local Maps
+        os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='scraper-benchmark-')
+        os.environ['CHROME_POOL_SIZE'] = '1'
+        os.environ['CHROME_POOL_PREWARM'] = '0'
+        os.environ['MAPS_BASE_URL'] = server.base_url
+        os.environ['CHROME_NETWORK_CAPTURE'] = '1' if args.extraction == 'network' else '0'
+        import scraper
+        scraper.init_scraper()
+
+        counter = RoundTripCounter()
+        counter.install()
+        options = {'extraction': args.extraction, 'lean': args.lean, 'prune_dom': args.prune_dom}
+        print(f"Fixtures served from {server.base_url}, options {options}")
+
+        results = []
+        try:
+            for repeat in range(args.repeat):
+                for fixture_name, selected_stars in CASES:
+                    if args.fixture and fixture_name not in args.fixture:
+                        continue
+                    result = run_case(scraper.scrape_google_maps_reviews, counter, server.base_url,
+                                      fixture_name, selected_stars, options)
+                    result['repeat'] = repeat
+                    print_result(result)
+                    results.append(result)
+        finally:
+            scraper.driver_pool.shutdown()
+
+    failed = [result for result in results if not result['ok']]
+    total_seconds = sum(result['seconds'] for result in results)
+    print(f"\n{len(results) - len(failed)}/{len(results)} cases passed in {total_seconds:.1f}s, "
+          f"{sum(result['round_trips'] for result in results)} round-trips")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'options': options, 'results': results}, f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
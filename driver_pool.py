@@ -0,0 +1,454 @@
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from selenium import webdriver
+
+from lean_mode import disable_lean_mode
+from metrics import DRIVER_LAUNCH_SECONDS, ORPHANS_REAPED
+from network_capture import EXTRACTION_STRATEGY
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration (overridable through the environment)
+POOL_SIZE = int(os.environ.get('CHROME_POOL_SIZE', 2))
+MAX_USES = int(os.environ.get('CHROME_MAX_USES', 25))
+MAX_RSS_MB = int(os.environ.get('CHROME_MAX_RSS_MB', 700))
+LEASE_TIMEOUT = float(os.environ.get('CHROME_LEASE_TIMEOUT', 90))
+PROFILE_ROOT = os.environ.get('CHROME_PROFILE_ROOT', tempfile.gettempdir())
+ORPHAN_REAP_INTERVAL = float(os.environ.get('CHROME_REAP_INTERVAL', 60))
+# Record network events in Chrome's performance log; only the network extraction strategy reads them
+NETWORK_CAPTURE = os.environ.get('CHROME_NETWORK_CAPTURE', '1' if EXTRACTION_STRATEGY == 'network' else '0') == '1'
+# Profile directories are named chrome-pool-<owner pid>-..., so orphans can be told apart across workers
+PROFILE_PREFIX = 'chrome-pool-'
+
+# Profile directories of the drivers this process launched and has not quit yet
+_live_profiles = set()
+_live_profiles_lock = threading.Lock()
+
+
+def _free_port():
+    """
+    Ask the OS for a free TCP port so drivers never share a debugging port,
+    not even across gunicorn workers.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def build_chrome_options(profile_dir, debug_port, network_capture=False):
+    """
+    Chrome options optimized for cloud deployment.
+    Every driver gets its own profile/cache directories and debugging port.
+    """
+    options = webdriver.ChromeOptions()
+    options.add_argument("--disable-notifications")
+    options.add_argument("--disable-infobars")
+    options.add_argument("--headless=new")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-web-security")
+    options.add_argument("--disable-features=VizDisplayCompositor")
+    options.add_argument(f"--remote-debugging-port={debug_port}")
+    options.add_argument("--single-process")
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-renderer-backgrounding")
+    options.add_argument("--disable-backgrounding-occluded-windows")
+    options.add_argument(f"--user-data-dir={os.path.join(profile_dir, 'user-data')}")
+    options.add_argument(f"--data-path={os.path.join(profile_dir, 'data')}")
+    options.add_argument(f"--cache-dir={os.path.join(profile_dir, 'cache')}")
+    options.add_argument(f"--disk-cache-dir={os.path.join(profile_dir, 'disk-cache')}")
+    if network_capture:
+        # Network events in the performance log, read by the network extraction strategy
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+    return options
+
+
+def _process_table():
+    """
+    {pid: (ppid, command line arguments)} of every process, read from /proc;
+    empty on platforms without procfs.
+    """
+    table = {}
+    if not os.path.isdir('/proc'):
+        return table
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces, so split after the closing paren
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                args = f.read().decode(errors='replace').split('\0')
+            table[int(entry)] = (ppid, args)
+        except (OSError, IndexError, ValueError):
+            continue
+    return table
+
+
+def _process_tree_rss_mb(root_pid):
+    """
+    Sum the resident memory of a process and all of its descendants.
+    Reads /proc directly, so it returns 0 on platforms without procfs.
+    """
+    if not root_pid:
+        return 0
+
+    children = {}
+    for pid, (ppid, _) in _process_table().items():
+        children.setdefault(ppid, []).append(pid)
+
+    total_kb = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _profile_owner(profile_dir):
+    """
+    PID of the process that created a pool profile directory
+    (chrome-pool-<pid>-...), None for any other directory.
+    """
+    name = os.path.basename(profile_dir.rstrip(os.sep))
+    if not name.startswith(PROFILE_PREFIX):
+        return None
+    owner = name[len(PROFILE_PREFIX):].split('-', 1)[0]
+    return int(owner) if owner.isdigit() else None
+
+
+def _orphaned_profile(profile_dir):
+    """
+    True for a pool profile whose owning process is gone, or which belongs to
+    this process but to no live driver (a launch or quit that went wrong).
+    """
+    owner = _profile_owner(profile_dir)
+    if owner is None:
+        return False
+    if owner == os.getpid():
+        with _live_profiles_lock:
+            return profile_dir not in _live_profiles
+    return not _pid_alive(owner)
+
+
+def reap_orphaned_chrome():
+    """
+    Kill Chrome processes (with their children and chromedriver parent) running on
+    an orphaned pool profile and delete orphaned profile directories, so browsers
+    left behind by crashed workers or failed quits stop holding memory.
+    Returns the number of processes killed.
+    """
+    table = _process_table()
+    children = {}
+    for pid, (ppid, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+
+    doomed = set()
+    for pid, (ppid, args) in table.items():
+        user_data = next((arg.split('=', 1)[1] for arg in args if arg.startswith('--user-data-dir=')), None)
+        if not user_data:
+            continue
+        profile_dir = os.path.dirname(os.path.abspath(user_data))
+        if os.path.dirname(profile_dir) != os.path.abspath(PROFILE_ROOT) or not _orphaned_profile(profile_dir):
+            continue
+        pending = [pid]
+        while pending:
+            current = pending.pop()
+            doomed.add(current)
+            pending.extend(children.get(current, []))
+        parent_args = table.get(ppid, (None, []))[1]
+        if parent_args and 'chromedriver' in os.path.basename(parent_args[0]):
+            doomed.add(ppid)
+
+    killed = 0
+    for pid in doomed:
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed += 1
+        except OSError:
+            continue
+    if killed:
+        ORPHANS_REAPED.inc(killed)
+        logger.warning(f"Killed {killed} orphaned Chrome processes")
+
+    try:
+        entries = os.listdir(PROFILE_ROOT)
+    except OSError:
+        entries = []
+    for entry in entries:
+        profile_dir = os.path.join(PROFILE_ROOT, entry)
+        if os.path.isdir(profile_dir) and _orphaned_profile(os.path.abspath(profile_dir)):
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            logger.info(f"Removed orphaned Chrome profile {profile_dir}")
+    return killed
+
+
+def start_orphan_reaper(interval=ORPHAN_REAP_INTERVAL):
+    """
+    Reap orphaned Chrome processes now and then every interval seconds in a daemon thread.
+    """
+    def loop():
+        while True:
+            try:
+                reap_orphaned_chrome()
+            except Exception as e:
+                logger.error(f"❌ Orphaned Chrome reaper failed: {e}")
+            time.sleep(interval)
+
+    if interval > 0:
+        threading.Thread(target=loop, daemon=True, name='chrome-reaper').start()
+
+
+class CountingChrome(webdriver.Chrome):
+    """
+    Chrome driver that counts its WebDriver commands (every round-trip to chromedriver,
+    including execute_script and CDP calls), so a scrape can report how many it made.
+    """
+
+    command_count = 0
+
+    def execute(self, driver_command, params=None):
+        self.command_count += 1
+        return super().execute(driver_command, params)
+
+
+class PooledDriver:
+    """
+    A launched Chrome instance owned by the pool.
+    Tracks how often it was leased and whether the cookie prompt was handled.
+    """
+
+    def __init__(self, network_capture=False):
+        # Registered under the lock so the reaper never sees the new directory as orphaned
+        with _live_profiles_lock:
+            profile_dir = tempfile.mkdtemp(prefix=f'{PROFILE_PREFIX}{os.getpid()}-', dir=PROFILE_ROOT)
+            self.profile_dir = os.path.abspath(profile_dir)
+            _live_profiles.add(self.profile_dir)
+        self.debug_port = _free_port()
+        self.uses = 0
+        self.cookies_accepted = False
+        self.lean = False
+        self.network_capture = network_capture
+        self.created_at = time.time()
+        try:
+            self.browser = CountingChrome(options=build_chrome_options(self.profile_dir, self.debug_port,
+                                                                       network_capture))
+        except Exception:
+            self._forget_profile()
+            raise
+
+    def rss_mb(self):
+        try:
+            return _process_tree_rss_mb(self.browser.service.process.pid)
+        except Exception:
+            return 0
+
+    def is_healthy(self):
+        try:
+            return len(self.browser.window_handles) > 0
+        except Exception:
+            return False
+
+    def reset(self):
+        """
+        Close any extra tabs and park the remaining one on a blank page.
+        Cookies are kept so the consent prompt does not come back; lean mode is switched off.
+        """
+        if self.lean:
+            disable_lean_mode(self.browser)
+            self.lean = False
+        if self.network_capture:
+            # Drop buffered network events so they do not pile up between leases
+            self.browser.get_log('performance')
+        handles = self.browser.window_handles
+        for handle in handles[1:]:
+            self.browser.switch_to.window(handle)
+            self.browser.close()
+        self.browser.switch_to.window(handles[0])
+        self.browser.get("about:blank")
+
+    def quit(self):
+        try:
+            self.browser.quit()
+        except Exception:
+            pass
+        self._forget_profile()
+
+    def _forget_profile(self):
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+        with _live_profiles_lock:
+            _live_profiles.discard(self.profile_dir)
+
+
+class DriverPool:
+    """
+    Bounded pool of pre-launched, health-checked Chrome drivers.
+    Drivers are recycled after max_uses leases or once their RSS crosses max_rss_mb.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_uses=MAX_USES, max_rss_mb=MAX_RSS_MB, network_capture=NETWORK_CAPTURE):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.network_capture = network_capture
+        self._idle = []
+        self._free_slots = self.size
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _launch(self):
+        started = time.perf_counter()
+        driver = PooledDriver(self.network_capture)
+        DRIVER_LAUNCH_SECONDS.observe(time.perf_counter() - started)
+        logger.info(f"✅ Chrome driver launched (port {driver.debug_port}, profile {driver.profile_dir})")
+        return driver
+
+    def _launch_into_pool(self):
+        try:
+            driver = self._launch()
+        except Exception as e:
+            logger.error(f"❌ Chrome driver pre-launch failed: {e}")
+            with self._cond:
+                self._free_slots += 1
+                self._cond.notify()
+            return
+        with self._cond:
+            if self._closed:
+                driver.quit()
+                return
+            self._idle.append(driver)
+            self._cond.notify()
+
+    def prewarm(self):
+        """
+        Launch drivers for every free slot in the background.
+        """
+        with self._cond:
+            count = self._free_slots
+            self._free_slots = 0
+        for _ in range(count):
+            threading.Thread(target=self._launch_into_pool, daemon=True).start()
+
+    def acquire(self, timeout=LEASE_TIMEOUT):
+        """
+        Lease a healthy driver, launching one if a slot is free.
+        Raises TimeoutError when no driver becomes available in time.
+        """
+        deadline = time.time() + timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._free_slots == 0:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise TimeoutError("No Chrome driver available in the pool")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    driver = self._idle.pop()
+                else:
+                    driver = None
+                    self._free_slots -= 1
+
+            if driver is None:
+                try:
+                    return self._launch()
+                except Exception:
+                    with self._cond:
+                        self._free_slots += 1
+                        self._cond.notify()
+                    raise
+
+            if driver.is_healthy():
+                return driver
+
+            logger.warning("Discarding unhealthy Chrome driver from the pool.")
+            driver.quit()
+            with self._cond:
+                self._free_slots += 1
+
+    def release(self, driver, discard=False):
+        """
+        Return a leased driver. It is reset for the next lease, or recycled
+        in the background when it is worn out, too large or broken.
+        """
+        driver.uses += 1
+        recycle = discard or self._closed or driver.uses >= self.max_uses
+        if not recycle:
+            rss = driver.rss_mb()
+            if self.max_rss_mb and rss > self.max_rss_mb:
+                logger.info(f"Recycling Chrome driver: RSS {rss:.0f} MB exceeds {self.max_rss_mb} MB")
+                recycle = True
+
+        if not recycle:
+            try:
+                driver.reset()
+            except Exception as e:
+                logger.warning(f"Could not reset Chrome driver, recycling it: {e}")
+                recycle = True
+
+        if recycle:
+            threading.Thread(target=self._recycle, args=(driver,), daemon=True).start()
+            return
+
+        with self._cond:
+            self._idle.append(driver)
+            self._cond.notify()
+
+    def _recycle(self, driver):
+        driver.quit()
+        with self._cond:
+            if self._closed:
+                return
+            self._free_slots += 1
+            self._cond.notify()
+        # Relaunch right away so the next request does not pay the cold start
+        with self._cond:
+            if self._free_slots == 0:
+                return
+            self._free_slots -= 1
+        self._launch_into_pool()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'free_slots': self._free_slots,
+                'leased': self.size - len(self._idle) - self._free_slots,
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for driver in idle:
+            driver.quit()
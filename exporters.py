@@ -0,0 +1,94 @@
+import csv
+import io
+import os
+import tempfile
+
+# Column order of every export, matching the scraper's review records
+EXPORT_COLUMNS = [
+    "Business Name",
+    "Average Rating",
+    "Total Reviews",
+    "Reviewer",
+    "Rating",
+    "Reviewed On",
+    "Reviewed On Date",
+    "Reviewed On Precision",
+    "Review Text",
+    "Review Link",
+]
+PARQUET_ROW_GROUP_SIZE = 10000
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(records, columns=EXPORT_COLUMNS):
+    """
+    Yield a CSV document row by row, so nothing but the current row is held in memory.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for record in records:
+        writer.writerow([record.get(column, "") for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_xlsx(records, path, columns=EXPORT_COLUMNS):
+    """
+    Write records to an Excel file using xlsxwriter's constant_memory mode,
+    which flushes every row to disk as soon as the next one starts.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Reviews')
+    header_format = workbook.add_format({'bold': True})
+    worksheet.write_row(0, 0, columns, header_format)
+    for row_number, record in enumerate(records, start=1):
+        worksheet.write_row(row_number, 0, [record.get(column, "") for column in columns])
+    workbook.close()
+
+
+def write_parquet(records, path, columns=EXPORT_COLUMNS, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    """
+    Write records to a Parquet file one row group at a time.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column, pa.string()) for column in columns])
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for record in records:
+            batch.append({column: _as_text(record.get(column)) for column in columns})
+            if len(batch) >= row_group_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+
+def _as_text(value):
+    return None if value is None else str(value)
+
+
+def iter_file_export(writer, records, suffix):
+    """
+    Run a file based writer (write_xlsx / write_parquet) into a temporary file and
+    stream it back in chunks; the file is removed once it has been sent.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        writer(records, path)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
@@ -0,0 +1,53 @@
+"""
+Small JSON files shared by the web process, batch workers and the monitor.
+
+Every write goes to its own temp file next to the target and replaces it
+atomically, so readers never see a partial file and concurrent writers do not
+truncate each other's temp file. Read-modify-write sequences take file_lock,
+an exclusive lock on a sidecar "<path>.lock" file, so processes merging into
+the same file do not drop each other's updates.
+"""
+import contextlib
+import json
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: writes stay atomic, but concurrent read-modify-writes can lose an update
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive inter-process lock for path (a no-op without fcntl).
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def write_json_atomic(path, data, **dump_options):
+    """
+    Write data as JSON to a unique temp file in path's directory, then move it over path.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, **dump_options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
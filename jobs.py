@@ -0,0 +1,142 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Job queue configuration (overridable through the environment)
+JOB_CONCURRENCY = int(os.environ.get('JOB_CONCURRENCY', os.environ.get('CHROME_POOL_SIZE', 2)))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600))
+
+
+def job_key(business_name, location, selected_stars, options=None):
+    """
+    Normalized identity of a scrape used to deduplicate jobs.
+    """
+    return (
+        ' '.join(business_name.lower().split()),
+        ' '.join(location.lower().split()),
+        tuple(sorted(set(int(star) for star in selected_stars))),
+        tuple(sorted((options or {}).items())),
+    )
+
+
+class Job:
+    def __init__(self, key, business_name, location, selected_stars, options=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.business_name = business_name
+        self.location = location
+        self.selected_stars = selected_stars
+        self.options = options or {}
+        self.summary = {}
+        self.status = 'queued'
+        self.progress = {'phase': None, 'reviews_loaded': 0, 'scroll_attempt': 0, 'max_scroll_attempts': None}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def handle_event(self, event):
+        """
+        Update progress from a scrape event (see emit_event in scrape_common).
+        """
+        if event['type'] == 'phase':
+            self.progress['phase'] = event['phase']
+        elif event['type'] == 'scroll':
+            self.progress['scroll_attempt'] = event['attempt']
+            self.progress['max_scroll_attempts'] = event['max_attempts']
+            self.progress['reviews_loaded'] = event['reviews_loaded']
+        elif event['type'] == 'summary':
+            self.summary.update({key: value for key, value in event.items() if key != 'type'})
+
+    def to_dict(self, include_results=True):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'business_name': self.business_name,
+            'location': self.location,
+            'selected_stars': self.selected_stars,
+            'options': self.options,
+            'progress': dict(self.progress),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.status == 'finished':
+            data['reviews_count'] = len(self.result)
+            data.update(self.summary)
+            if include_results:
+                data['reviews'] = self.result
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """
+    Runs scrape jobs on a bounded worker pool.
+    Identical requests (business, location, stars) share one active job.
+    """
+
+    def __init__(self, scrape_func, concurrency=JOB_CONCURRENCY, result_ttl=JOB_RESULT_TTL):
+        self.scrape_func = scrape_func
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._active_by_key = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='scrape-job')
+
+    def submit(self, business_name, location, selected_stars, options=None):
+        """
+        Queue a scrape job. Returns (job, created); created is False when an
+        identical job is already queued or running.
+        """
+        key = job_key(business_name, location, selected_stars, options)
+        with self._lock:
+            self._prune()
+            existing = self._active_by_key.get(key)
+            if existing is not None:
+                return existing, False
+            job = Job(key, business_name, location, selected_stars, options)
+            self._jobs[job.id] = job
+            self._active_by_key[key] = job
+        self._executor.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            job.result = self.scrape_func(job.business_name, job.location, job.selected_stars,
+                                          on_event=job.handle_event, **job.options)
+            job.status = 'finished'
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._active_by_key.get(job.key) is job:
+                    del self._active_by_key[job.key]
+
+    def _prune(self):
+        # Drop finished jobs whose results have expired (called with the lock held)
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if not job.active and job.finished_at and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
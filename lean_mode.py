@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+
+from review_extraction import extract_raw_reviews
+
+logger = logging.getLogger(__name__)
+
+# Scrapes run in lean mode unless a request says otherwise
+LEAN_MODE_DEFAULT = os.environ.get('LEAN_MODE', '0') == '1'
+# Viewport used in lean mode; the review list is a narrow side panel, so a small window is enough
+LEAN_VIEWPORT = (int(os.environ.get('LEAN_VIEWPORT_WIDTH', 1024)), int(os.environ.get('LEAN_VIEWPORT_HEIGHT', 768)))
+# Lean mode is switched off for this process after this many scrapes in a row failed the extraction check
+LEAN_GUARD_MAX_FAILURES = int(os.environ.get('LEAN_GUARD_MAX_FAILURES', 3))
+
+# Requests never needed to read reviews: images and avatars, map tiles, fonts and media.
+# Scripts, styles and the XHR/RPC calls that deliver the reviews are left alone.
+LEAN_BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.ico', '*.svg',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*.mp4', '*.webm', '*.mp3',
+    '*googleusercontent.com/*',
+    '*/maps/vt?*', '*/maps/vt/*', '*/kh/v=*', '*khms*.google*',
+    '*streetviewpixels-pa.googleapis.com/*',
+]
+
+# Resource timing of the current page. Cross-origin responses without a
+# Timing-Allow-Origin header report a transferSize of 0, so the byte count is a
+# lower bound; it is comparable between runs with lean mode on and off.
+PAGE_TRANSFER_FN = r"""
+() => {
+    const entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+    let bytes = 0;
+    for (const entry of entries) {
+        bytes += entry.transferSize || 0;
+    }
+    return {transferred_bytes: bytes, resource_count: entries.length};
+}
+"""
+
+
+def enable_lean_mode(browser, shrink_viewport=True):
+    """
+    Block heavy resources through CDP for the current lease (and shrink the viewport).
+    This is set per lease rather than through Chrome launch preferences, so a pooled
+    driver can serve lean and regular scrapes; see disable_lean_mode.
+    """
+    browser.execute_cdp_cmd('Network.enable', {})
+    browser.execute_cdp_cmd('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URLS})
+    if shrink_viewport:
+        width, height = LEAN_VIEWPORT
+        browser.execute_cdp_cmd('Emulation.setDeviceMetricsOverride', {
+            'width': width, 'height': height, 'deviceScaleFactor': 1, 'mobile': False,
+        })
+
+
+def disable_lean_mode(browser):
+    browser.execute_cdp_cmd('Network.setBlockedURLs', {'urls': []})
+    browser.execute_cdp_cmd('Emulation.clearDeviceMetricsOverride', {})
+
+
+def start_page_stats(browser):
+    """
+    Keep every resource timing entry of the page (the default buffer holds 250).
+    """
+    try:
+        browser.execute_script("performance.setResourceTimingBufferSize(100000);")
+    except Exception as e:
+        logger.warning(f"Could not enlarge the resource timing buffer: {e}")
+
+
+def page_transfer_stats(browser):
+    try:
+        return browser.execute_script(f"return ({PAGE_TRANSFER_FN})();")
+    except Exception as e:
+        logger.warning(f"Could not read page transfer stats: {e}")
+        return {}
+
+
+def lean_extraction_ok(browser):
+    """
+    Check that the loaded reviews still carry what extraction reads (review id,
+    reviewer and rating) with resources blocked. A place without reviews passes.
+    """
+    batch = extract_raw_reviews(browser, tail=3)
+    if batch['count'] == 0:
+        return True
+    return any(raw['review_id'] and raw['reviewer'] and (raw['rating_label'] or raw['rating_numeric'] or raw['rating_slash'])
+               for raw in batch['reviews'])
+
+
+class LeanModeStats:
+    """
+    Per mode (lean / regular) totals of scrapes, transferred bytes and scroll batch
+    timings, plus the guard that turns lean mode off when extraction breaks with it.
+    """
+
+    def __init__(self, max_failures=LEAN_GUARD_MAX_FAILURES):
+        self.max_failures = max_failures
+        self.consecutive_failures = 0
+        self.tripped = False
+        self._lock = threading.Lock()
+        self._totals = {mode: {'scrapes': 0, 'transferred_bytes': 0, 'scroll_batches': 0, 'scroll_batch_ms': 0}
+                        for mode in ('lean', 'regular')}
+
+    def allowed(self):
+        return not self.tripped
+
+    def record_check(self, ok):
+        with self._lock:
+            if ok:
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.max_failures and not self.tripped:
+                self.tripped = True
+                logger.warning(f"Lean mode disabled: extraction check failed {self.consecutive_failures} scrapes in a row")
+
+    def record_scrape(self, lean, page_stats):
+        with self._lock:
+            totals = self._totals['lean' if lean else 'regular']
+            totals['scrapes'] += 1
+            totals['transferred_bytes'] += page_stats.get('transferred_bytes', 0)
+            totals['scroll_batches'] += page_stats.get('scroll_batches', 0)
+            totals['scroll_batch_ms'] += page_stats.get('scroll_batch_ms', 0)
+
+    def stats(self):
+        with self._lock:
+            report = {'guard_tripped': self.tripped, 'consecutive_check_failures': self.consecutive_failures}
+            for mode, totals in self._totals.items():
+                scrapes, batches = totals['scrapes'], totals['scroll_batches']
+                report[mode] = {
+                    **totals,
+                    'avg_transferred_bytes': round(totals['transferred_bytes'] / scrapes) if scrapes else None,
+                    'avg_scroll_batch_ms': round(totals['scroll_batch_ms'] / batches, 1) if batches else None,
+                }
+            return report
@@ -0,0 +1,49 @@
+import json
+import logging
+import os
+
+# INFO reports each scrape's progress; DEBUG adds one line per review and scroll attempt
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# "text" for readable lines, "json" for one JSON object per line
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record with time, level, logger, message and the
+    fields passed as `extra`, e.g. logger.info("...", extra={'page_stats': ...}).
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=LOG_LEVEL, log_format=LOG_FORMAT):
+    """
+    Route the scraper's loggers to stderr. Safe to call more than once.
+    """
+    handler = logging.StreamHandler()
+    if log_format == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    # Selenium and urllib3 log every WebDriver request; keep them quiet even at DEBUG
+    for noisy in ('selenium', 'urllib3', 'WDM'):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
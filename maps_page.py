@@ -0,0 +1,68 @@
+"""
+The Google Maps page as both scraper backends see it: where it is served from
+and the fallback selectors of the elements a scrape reads or clicks.
+"""
+import os
+
+# Origin of Google Maps; the offline benchmark (benchmarks/run.py) points it at its fixture server
+MAPS_BASE_URL = os.environ.get('MAPS_BASE_URL', 'https://www.google.com').rstrip('/')
+
+# Fallback selectors per page element (XPath or CSS); see SelectorRegistry for how they are tried
+BUSINESS_NAME_SELECTORS = [
+    'h1.DUwDvf',
+]
+AVERAGE_RATING_SELECTORS = [
+    '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[2]/div/div[1]/div[2]/div/div[1]/div[2]/span[1]/span[1]',
+    'div.F7nice > span > span[aria-hidden="true"]',
+]
+TOTAL_REVIEWS_SELECTORS = [
+    '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[2]/div/div[1]/div[2]/div/div[1]/div[2]/span[2]/span/span',
+    'div.F7nice span[aria-label*="review" i]',
+    'div.F7nice span[aria-label*="Rezension"]',
+]
+# Groups read from the place overview panel
+OVERVIEW_SELECTORS = {
+    'business_name': BUSINESS_NAME_SELECTORS,
+    'average_rating': AVERAGE_RATING_SELECTORS,
+    'total_reviews': TOTAL_REVIEWS_SELECTORS,
+}
+REVIEWS_TAB_SELECTORS = [
+    '//button[contains(@aria-label, "Reviews for") or contains(@aria-label, "Rezensionen für")]',
+    '//button[@role="tab"][contains(., "Reviews") or contains(., "Rezensionen")]',
+    '//div[contains(@class, "Gpq6kf") and contains(@class, "NlVald") and (text()="Reviews" or text()="Rezensionen")]',
+]
+SORT_BUTTON_SELECTORS = [
+    '//span[@class="Cw1rxd google-symbols G47vBd"]',
+    '//button[@class="HQzyZ"][@aria-label="Most relevant"]',
+    '//button[contains(@aria-label, "Most relevant")]',
+    '//div[@class="fontBodyLarge k5lwKb" and text()="Most relevant"]',
+    '//span[@class="GMtm7c fontTitleSmall" and text()="Sort"]',
+    '//*[@id="QA0Szd"]/div/div/div[1]/div[2]/div/div[1]/div/div/div[4]/div[10]/button[2]/div',
+]
+REVIEW_AREA_SELECTORS = [
+    '//div[@role="main"]/div[contains(@class, "review-dialog-list")]',
+    '//div[contains(@aria-label, "Reviews for") or contains(@aria-label, "Rezensionen für")]/following-sibling::div//div[contains(@class, "DxyBCb")]',
+    '//div[contains(@class, "DxyBCb")]',
+]
+
+# Position of each option in the reviews "Sort" menu
+SORT_MENU_OPTIONS = {
+    'relevant': 1,
+    'newest': 2,
+    'highest': 3,
+    'lowest': 4,
+}
+
+# Rendered once a Maps page is usable: a place panel, search results, reviews or the consent form
+NAVIGATION_READY_SELECTORS = ['h1.DUwDvf', 'div[role="feed"]', 'div[data-review-id]', 'form[action*="consent"]',
+                              'button[aria-label*="Accept"]']
+# The "Accept all" button of the cookie consent form
+COOKIE_ACCEPT_XPATH = '//button[.//span[contains(text(),"Accept all") or contains(text(),"Alle akzeptieren")]]'
+
+
+def search_url(business_name, location):
+    """
+    Maps search URL for a business and its location.
+    """
+    search_query = f"{business_name} {location}".replace(' ', '+')
+    return f"{MAPS_BASE_URL}/maps/search/{search_query}"
@@ -0,0 +1,172 @@
+"""
+Scrape metrics in the Prometheus text exposition format, served by GET /metrics.
+
+Counters and histograms live in this process only (like the result cache and
+the stats endpoints); with several gunicorn workers each worker reports its own.
+"""
+import threading
+import time
+
+# Seconds, from a quick DOM probe up to a full scroll through a large place
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Counts of scroll attempts or WebDriver commands per scrape
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2500)
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = []
+    for name, value in zip(labelnames, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, {'counts': [0] * len(self.buckets), 'sum': 0, 'count': 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['counts']):
+                    labels = _format_labels(self.labelnames + ('le',), key + (_format_number(bound),))
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {_format_number(series["sum"])}')
+                lines.append(f'{self.name}_count{labels} {series["count"]}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+DRIVER_LAUNCH_SECONDS = registry.histogram(
+    'scraper_driver_launch_seconds', 'Time to launch a Chrome driver.')
+PHASE_SECONDS = registry.histogram(
+    'scraper_phase_seconds', 'Time spent per scrape phase (driver lease, navigate, cookies, overview, '
+    'reviews_tab, sort, scroll, extract).', ['phase'])
+SCROLL_ATTEMPTS = registry.histogram(
+    'scraper_scroll_attempts', 'Scroll attempts per scrape.', buckets=COUNT_BUCKETS)
+SCROLL_BATCH_SECONDS = registry.histogram(
+    'scraper_scroll_batch_seconds', 'Time from one scroll until the next batch of reviews rendered (or the idle timeout).')
+WEBDRIVER_COMMANDS = registry.histogram(
+    'scraper_webdriver_commands', 'WebDriver commands (round-trips) per scrape.', buckets=COUNT_BUCKETS)
+SCRAPES = registry.counter(
+    'scraper_scrapes_total', 'Finished scrapes by outcome.', ['outcome'])
+REVIEWS_EXTRACTED = registry.counter(
+    'scraper_reviews_extracted_total', 'Reviews extracted with the selected star ratings.')
+EARLY_STOPS = registry.counter(
+    'scraper_early_stops_total', 'Scroll loops stopped before the end of the list, by reason.', ['reason'])
+SELECTOR_FALLBACKS = registry.counter(
+    'scraper_selector_fallbacks_total', 'Element lookups won by a candidate other than the first one tried.', ['group'])
+SELECTOR_MISSES = registry.counter(
+    'scraper_selector_misses_total', 'Element lookups where no candidate matched.', ['group'])
+ADMISSIONS = registry.counter(
+    'scraper_admissions_total', 'Admission decisions for scrapes that need a browser (admitted, queued, rejected).',
+    ['result'])
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    'scraper_admission_wait_seconds', 'Time a scrape waited for an admission slot.')
+ORPHANS_REAPED = registry.counter(
+    'scraper_orphaned_chrome_reaped_total', 'Orphaned Chrome and chromedriver processes killed.')
+
+
+class PhaseTimer:
+    """
+    Times the phases of one scrape from its 'phase' events: a phase lasts until
+    the next one starts, and 'done' (or finish()) closes the last one.
+    """
+
+    def __init__(self):
+        self._phase = None
+        self._started = None
+
+    def enter(self, phase):
+        self.finish()
+        if phase != 'done':
+            self._phase, self._started = phase, time.perf_counter()
+
+    def finish(self):
+        if self._phase is not None:
+            PHASE_SECONDS.observe(time.perf_counter() - self._started, phase=self._phase)
+            self._phase = None
+
+
+def timed_events(on_event):
+    """
+    Wrap a scrape's event callback so its phases are recorded in PHASE_SECONDS.
+    Returns (callback, timer); call timer.finish() when the scrape ends early.
+    """
+    timer = PhaseTimer()
+
+    def forward(event):
+        if event['type'] == 'phase':
+            timer.enter(event['phase'])
+        if on_event is not None:
+            on_event(event)
+
+    return forward, timer
@@ -0,0 +1,379 @@
+"""
+Monitoring daemon that re-scrapes a watchlist of businesses and emits only their new reviews.
+
+Usage:
+    python -m monitor watchlist.csv [--output new_reviews.jsonl] [--state monitor_state.json]
+                                    [--rate-per-minute 6] [--workers 1] [--once]
+
+The watchlist has the batch input format (CSV with business_name, location,
+stars or JSONL) and is re-read when it changes. Every business is scraped
+incrementally: the first run only records the reviews that exist (the
+baseline), later runs append each new review with one of the selected star
+ratings to the output as one JSON line.
+How often a business is checked follows its review velocity, so busy places
+are checked often and quiet ones rarely. All scrapes share one token bucket,
+which limits the request rate against Google Maps. Scrapes that fail while
+leasing a driver, navigating or opening the Reviews tab are retried with
+exponential backoff and jitter. The schedule is saved after every scrape;
+after a restart, overdue businesses are spread out at the rate limit instead
+of all running at once.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from batch import read_batch_rows, row_checkpoint_key
+from file_store import file_lock, write_json_atomic
+from logging_setup import configure_logging
+from seen_reviews import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Monitor configuration (overridable through the environment)
+RATE_PER_MINUTE = float(os.environ.get('MONITOR_RATE_PER_MINUTE', 6))
+BURST = int(os.environ.get('MONITOR_BURST', 3))
+WORKERS = int(os.environ.get('MONITOR_WORKERS', 1))
+DEFAULT_INTERVAL = float(os.environ.get('MONITOR_DEFAULT_INTERVAL', 24 * 3600))
+MIN_INTERVAL = float(os.environ.get('MONITOR_MIN_INTERVAL', 3600))
+MAX_INTERVAL = float(os.environ.get('MONITOR_MAX_INTERVAL', 7 * 24 * 3600))
+# Aim for about this many new reviews (of any rating) per check
+TARGET_NEW_REVIEWS = float(os.environ.get('MONITOR_TARGET_NEW_REVIEWS', 5))
+MAX_RETRIES = int(os.environ.get('MONITOR_MAX_RETRIES', 4))
+RETRY_BASE_SECONDS = float(os.environ.get('MONITOR_RETRY_BASE', 60))
+RETRY_CAP_SECONDS = float(os.environ.get('MONITOR_RETRY_CAP', 3600))
+STATE_PATH = os.environ.get('MONITOR_STATE', os.path.join(DATA_DIR, 'monitor_state.json'))
+
+# Phases whose failures are usually transient (no free driver, a slow page, the tab not rendered yet)
+RETRYABLE_PHASES = ('driver', 'navigate', 'cookies', 'reviews_tab')
+# Weight of the latest observation in the review velocity
+VELOCITY_SMOOTHING = 0.3
+# Longest sleep of the scheduler loop, so watchlist changes and signals are noticed
+MAX_IDLE_SECONDS = 30
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all scrapes: rate_per_minute tokens are added per
+    minute, at most burst of them are kept, and every scrape takes one.
+    """
+
+    def __init__(self, rate_per_minute=RATE_PER_MINUTE, burst=BURST):
+        self.rate = max(rate_per_minute, 0.001) / 60
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        # Called with the lock held
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, stop_event=None):
+        """
+        Take a token, waiting for one if necessary. Returns False when stop_event was set first.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if stop_event is None:
+                time.sleep(wait)
+            elif stop_event.wait(wait):
+                return False
+
+
+def backoff_delay(attempt, base=RETRY_BASE_SECONDS, cap=RETRY_CAP_SECONDS):
+    """
+    Exponential backoff with full jitter: uniform in [0, min(cap, base * 2^attempt)].
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def refresh_interval(velocity):
+    """
+    Seconds until the next check of a business receiving `velocity` reviews per day.
+    """
+    if velocity is None:
+        return DEFAULT_INTERVAL
+    if velocity <= 0:
+        return MAX_INTERVAL
+    return min(MAX_INTERVAL, max(MIN_INTERVAL, TARGET_NEW_REVIEWS / velocity * 86400))
+
+
+class MonitorState:
+    """
+    Schedule and history of every watched business, saved as one JSON file.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f).get('entries', {})
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        with self._lock, file_lock(self.path):
+            write_json_atomic(self.path, {'entries': self.entries, 'saved_at': time.time()},
+                              ensure_ascii=False, indent=1)
+
+
+class ChangeOutput:
+    """
+    Appends new reviews to a JSONL file (or stdout), one line per review.
+    """
+
+    def __init__(self, output_path=None):
+        self._output = open(output_path, 'a', encoding='utf-8') if output_path else sys.stdout
+        self._lock = threading.Lock()
+
+    def write(self, row, reviews, business_id=None):
+        detected_at = time.time()
+        with self._lock:
+            for record in reviews:
+                self._output.write(json.dumps({
+                    'business_name': row['business_name'],
+                    'location': row['location'],
+                    'selected_stars': row['selected_stars'],
+                    'business_id': business_id,
+                    'detected_at': detected_at,
+                    'review': record,
+                }, ensure_ascii=False) + '\n')
+            self._output.flush()
+
+    def close(self):
+        if self._output is not sys.stdout:
+            self._output.close()
+
+
+def _scrape_and_store(*args, **kwargs):
+    from scraper import init_scraper, scrape_and_store
+    init_scraper()
+    return scrape_and_store(*args, **kwargs)
+
+
+class Monitor:
+    """
+    Schedules incremental scrapes of the watchlist rows and writes their new reviews to output.
+    """
+
+    def __init__(self, watchlist_path, output, state, bucket=None, workers=WORKERS, scrape_func=_scrape_and_store):
+        self.watchlist_path = watchlist_path
+        self.output = output
+        self.state = state
+        self.bucket = bucket or TokenBucket()
+        self.workers = max(1, workers)
+        self.scrape_func = scrape_func
+        self.rows = {}
+        self._watchlist_mtime = None
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def load_watchlist(self):
+        """
+        (Re-)read the watchlist when it changed and schedule businesses that have
+        no upcoming run yet, spread out at the rate of the token bucket.
+        """
+        try:
+            mtime = os.path.getmtime(self.watchlist_path)
+        except OSError as e:
+            logger.error(f"❌ Cannot read watchlist {self.watchlist_path}: {e}")
+            return
+        if mtime == self._watchlist_mtime:
+            return
+        self._watchlist_mtime = mtime
+        rows = {row_checkpoint_key(row): row for row in read_batch_rows(self.watchlist_path)}
+
+        now = time.time()
+        with self._lock:
+            self.rows = rows
+            for key in self.rows:
+                self.state.entries.setdefault(key, {'next_run_at': 0, 'interval': DEFAULT_INTERVAL, 'velocity': None,
+                                                    'retries': 0})
+            # New and overdue businesses would otherwise all be due right now
+            due = [key for key in self.rows if self.state.entries[key]['next_run_at'] <= now]
+            spread = len(due) / self.bucket.rate
+            for key in due:
+                self.state.entries[key]['next_run_at'] = now + random.uniform(0, spread)
+        self._save()
+        logger.info(f"Watching {len(self.rows)} businesses, {len(due)} due within {spread:.0f}s")
+
+    def _save(self):
+        # Entries change under the lock, so they are written under it too
+        with self._lock:
+            self.state.save()
+
+    def due_keys(self, now):
+        with self._lock:
+            due = [key for key in self.rows
+                   if key not in self._running and self.state.entries[key]['next_run_at'] <= now]
+        return sorted(due, key=lambda key: self.state.entries[key]['next_run_at'])
+
+    def seconds_until_next(self, now):
+        with self._lock:
+            upcoming = [self.state.entries[key]['next_run_at'] for key in self.rows if key not in self._running]
+            # A running check may reschedule itself soon (a retry), so look again shortly
+            if self._running:
+                upcoming.append(now + 1)
+        return max(0, min(upcoming) - now) if upcoming else MAX_IDLE_SECONDS
+
+    def check(self, key, row):
+        """
+        Scrape one business incrementally, emit its new reviews and schedule its next check.
+        """
+        try:
+            self._check(key, row)
+        except Exception as e:
+            logger.error(f"❌ Monitoring {row['business_name']} ({row['location']}) failed: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(key)
+
+    def _check(self, key, row):
+        summary = {}
+        phases = []
+
+        def collect(event):
+            if event['type'] == 'summary':
+                summary.update(event)
+            elif event['type'] == 'phase':
+                phases.append(event['phase'])
+
+        error = None
+        reviews = []
+        try:
+            reviews = self.scrape_func(row['business_name'], row['location'], row['selected_stars'], on_event=collect,
+                                       incremental=True, admission_timeout=None)
+        except Exception as e:
+            error = str(e)
+        if error is None and not summary.get('place_url'):
+            error = f"Scrape failed in phase {phases[-1] if phases else 'driver'}"
+        retryable = (error is not None and not summary.get('place_url')
+                     and (not phases or phases[-1] in RETRYABLE_PHASES))
+        baseline = False
+
+        now = time.time()
+        with self._lock:
+            entry = self.state.entries[key]
+            entry['last_run_at'] = now
+            if error is not None:
+                entry['last_error'] = error
+                if retryable and entry['retries'] < MAX_RETRIES:
+                    delay = backoff_delay(entry['retries'])
+                    entry['retries'] += 1
+                    logger.warning(f"❌ {row['business_name']} ({row['location']}): {error}; "
+                                   f"retry {entry['retries']}/{MAX_RETRIES} in {delay:.0f}s")
+                else:
+                    delay = entry['interval']
+                    entry['retries'] = 0
+                    logger.error(f"❌ {row['business_name']} ({row['location']}): {error}; "
+                                 f"next check in {delay:.0f}s")
+                entry['next_run_at'] = now + delay
+            else:
+                known_total = summary.get('known_reviews_total')
+                baseline = entry.get('known_reviews_total') is None
+                if not baseline and entry.get('last_success_at') and known_total is not None:
+                    days = max(now - entry['last_success_at'], 1) / 86400
+                    observed = max(0, known_total - entry['known_reviews_total']) / days
+                    entry['velocity'] = observed if entry['velocity'] is None else (
+                        (1 - VELOCITY_SMOOTHING) * entry['velocity'] + VELOCITY_SMOOTHING * observed)
+                entry['interval'] = refresh_interval(entry['velocity'])
+                entry['known_reviews_total'] = known_total
+                entry['last_success_at'] = now
+                entry['retries'] = 0
+                entry.pop('last_error', None)
+                # Small jitter keeps businesses added together from staying in lockstep
+                entry['next_run_at'] = now + entry['interval'] * random.uniform(0.9, 1.1)
+                if baseline:
+                    logger.info(f"✅ Baseline for {row['business_name']} ({row['location']}): "
+                                f"{known_total} reviews known")
+                else:
+                    entry['new_reviews_total'] = entry.get('new_reviews_total', 0) + len(reviews)
+                    logger.info(f"✅ {row['business_name']} ({row['location']}): {len(reviews)} new reviews, "
+                                f"next check in {entry['interval'] / 3600:.1f}h")
+        if error is None and not baseline and reviews:
+            self.output.write(row, reviews, summary.get('business_id'))
+        self._save()
+
+    def run(self, stop_event=None, once=False):
+        """
+        Check due businesses until stop_event is set. With once, every business is
+        checked a single time right away (still at the rate limit) and run returns.
+        """
+        stop_event = stop_event or threading.Event()
+        self.load_watchlist()
+        if once:
+            with self._lock:
+                for key in self.rows:
+                    self.state.entries[key]['next_run_at'] = 0
+        pending_once = set(self.rows) if once else None
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='monitor') as executor:
+            while not stop_event.is_set():
+                if not once:
+                    self.load_watchlist()
+                for key in self.due_keys(time.time()):
+                    with self._lock:
+                        if len(self._running) >= self.workers:
+                            break
+                    if not self.bucket.acquire(stop_event):
+                        break
+                    with self._lock:
+                        self._running.add(key)
+                    executor.submit(self.check, key, self.rows[key])
+                    if once:
+                        pending_once.discard(key)
+                if once and not pending_once:
+                    break
+                stop_event.wait(min(MAX_IDLE_SECONDS, max(1, self.seconds_until_next(time.time()))))
+        self._save()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Watch Google Maps businesses and emit their new reviews.')
+    parser.add_argument('watchlist', help='CSV (business_name, location, stars) or JSONL watchlist')
+    parser.add_argument('--output', '-o', help='JSONL file for new reviews, default: stdout')
+    parser.add_argument('--state', default=STATE_PATH, help='Schedule state file')
+    parser.add_argument('--rate-per-minute', type=float, default=RATE_PER_MINUTE,
+                        help='Scrapes started per minute across all businesses')
+    parser.add_argument('--burst', type=int, default=BURST, help='Scrapes that may start back to back')
+    parser.add_argument('--workers', '-w', type=int, default=WORKERS, help='Scrapes running at once')
+    parser.add_argument('--once', action='store_true', help='Check every business once and exit')
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    # One warm Chrome per concurrent scrape, launched on first use
+    os.environ.setdefault('CHROME_POOL_SIZE', str(max(1, args.workers)))
+    os.environ.setdefault('CHROME_POOL_PREWARM', '0')
+
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop_event.set())
+
+    output = ChangeOutput(args.output)
+    monitor = Monitor(args.watchlist, output, MonitorState(args.state),
+                      TokenBucket(args.rate_per_minute, args.burst), workers=args.workers)
+    try:
+        monitor.run(stop_event, once=args.once)
+    finally:
+        output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import json
+import logging
+import os
+from collections import OrderedDict
+
+# "dom" reads the rendered review nodes, "network" parses the review responses Maps
+# loads while scrolling and only falls back to the DOM for reviews it did not capture
+EXTRACTION_STRATEGY = os.environ.get('EXTRACTION_STRATEGY', 'dom')
+EXTRACTION_STRATEGIES = ('dom', 'network')
+
+# Endpoints that return pages of reviews (current and older Maps frontends)
+REVIEW_PAYLOAD_URLS = ('/maps/rpc/listugcposts', '/maps/preview/review/listentitiesreviews')
+# Anti-JSON-hijacking prefix in front of every Maps RPC response
+XSSI_PREFIX = ")]}'"
+
+logger = logging.getLogger(__name__)
+
+# Where the fields of one review sit in each known payload layout. Google changes
+# these arrays without notice, so every lookup is optional and a review without
+# an id or rating is left to the DOM fallback.
+PAYLOAD_LAYOUTS = [
+    {
+        # listugcposts: data[2] = [[review, ...], ...]
+        'reviews': (2,),
+        'entry': (0,),
+        'review_id': [(0,)],
+        'reviewer': [(1, 4, 5, 0), (1, 4, 0, 4)],
+        'rating': [(2, 0, 0)],
+        'date_text': [(1, 6)],
+        'review_text': [(2, 15, 0, 0), (2, 15, 1, 0)],
+    },
+    {
+        # listentitiesreviews: data[2] = [review, ...]
+        'reviews': (2,),
+        'entry': (),
+        'review_id': [(10,)],
+        'reviewer': [(0, 1)],
+        'rating': [(4,)],
+        'date_text': [(1,)],
+        'review_text': [(3,)],
+    },
+]
+
+
+def _dig(value, path):
+    for index in path:
+        if not isinstance(value, list) or not -len(value) <= index < len(value):
+            return None
+        value = value[index]
+    return value
+
+
+def _first(entry, paths, expected_type):
+    for path in paths:
+        value = _dig(entry, path)
+        if isinstance(value, expected_type) and not isinstance(value, bool):
+            return value
+    return None
+
+
+def parse_review_payload(body):
+    """
+    Parse a review RPC response into raw reviews shaped like the DOM extractor's
+    (see EXTRACT_REVIEWS_FN), so parse_rating / parse_date_and_source apply unchanged.
+    The network payload carries the full review text, so has_more is always False.
+    """
+    if body.startswith(XSSI_PREFIX):
+        body = body[len(XSSI_PREFIX):]
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return []
+
+    for layout in PAYLOAD_LAYOUTS:
+        entries = _dig(data, layout['reviews'])
+        if not isinstance(entries, list):
+            continue
+        raw_reviews = []
+        for item in entries:
+            entry = _dig(item, layout['entry'])
+            review_id = _first(entry, layout['review_id'], str)
+            rating = _first(entry, layout['rating'], int)
+            if not review_id or not rating or not 1 <= rating <= 5:
+                continue
+            raw_reviews.append({
+                'review_id': review_id,
+                'rating_label': f"{rating} stars",
+                'rating_numeric': None,
+                'rating_slash': None,
+                'reviewer': _first(entry, layout['reviewer'], str),
+                'date_text': _first(entry, layout['date_text'], str),
+                'du9pgb_text': None,
+                'xrkppb_text': None,
+                'review_text': _first(entry, layout['review_text'], str) or "",
+                'has_more': False,
+            })
+        if raw_reviews:
+            return raw_reviews
+    return []
+
+
+class NetworkReviewCollector:
+    """
+    Collects the review responses of one scrape from Chrome's performance log
+    (Network.* events, see build_chrome_options) and reads their bodies with
+    Network.getResponseBody once they finished loading.
+    """
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.reviews = OrderedDict()
+        self.responses = 0
+        self.failed_responses = 0
+        self._pending = set()
+        # Drop whatever an earlier page left in the log
+        browser.get_log('performance')
+
+    def poll(self):
+        """
+        Drain the performance log and parse every finished review response.
+        Returns the number of newly captured reviews.
+        """
+        finished = set()
+        for entry in self.browser.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            method, params = message.get('method'), message.get('params', {})
+            if method == 'Network.responseReceived':
+                if any(pattern in params.get('response', {}).get('url', '') for pattern in REVIEW_PAYLOAD_URLS):
+                    self._pending.add(params['requestId'])
+            elif method == 'Network.loadingFinished':
+                finished.add(params.get('requestId'))
+            elif method == 'Network.loadingFailed' and params.get('requestId') in self._pending:
+                self._pending.discard(params['requestId'])
+                self.failed_responses += 1
+
+        before = len(self.reviews)
+        for request_id in self._pending & finished:
+            self._pending.discard(request_id)
+            try:
+                body = self.browser.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})['body']
+            except Exception as e:
+                logger.warning(f"Could not read review response body: {e}")
+                self.failed_responses += 1
+                continue
+            self.responses += 1
+            for raw in parse_review_payload(body):
+                self.reviews.setdefault(raw['review_id'], raw)
+        return len(self.reviews) - before
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from file_store import file_lock, write_json_atomic
+from jobs import job_key
+from seen_reviews import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+PLACE_CACHE_PATH = os.environ.get('PLACE_CACHE_PATH', os.path.join(DATA_DIR, 'places.json'))
+# The cached overview (average rating, total reviews) is re-read after this many seconds
+PLACE_CACHE_TTL = int(os.environ.get('PLACE_CACHE_TTL', 7 * 24 * 3600))
+
+
+def place_query_key(business_name, location):
+    return '|'.join(job_key(business_name, location, [])[:2])
+
+
+class PlaceCache:
+    """
+    Persistent mapping from a normalized (business, location) query to the resolved
+    Maps place: its place URL, the URL of its reviews view and the business overview.
+    Stored as one JSON file, rewritten atomically on every change. Writes re-read the
+    file under an inter-process lock (see file_store), so batch worker processes sharing
+    it do not drop each other's entries. A failed write is logged and never fails the scrape.
+    """
+
+    def __init__(self, path=PLACE_CACHE_PATH, ttl=PLACE_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._places = None
+
+    def _load(self):
+        # Called with the lock held
+        if self._places is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._places = json.load(f)
+            except (OSError, ValueError):
+                self._places = {}
+        return self._places
+
+    def _update(self, change):
+        # Re-read the file, apply change(places) and save when it returns True
+        with self._lock:
+            try:
+                with file_lock(self.path):
+                    self._places = None
+                    if change(self._load()):
+                        write_json_atomic(self.path, self._places, ensure_ascii=False)
+            except OSError as e:
+                logger.warning(f"Could not save place cache: {e}")
+
+    def get(self, business_name, location):
+        """
+        Returns the cached place dict (place_url, reviews_url, business) or None
+        when the query is unknown or its entry has expired.
+        """
+        with self._lock:
+            place = self._load().get(place_query_key(business_name, location))
+            if not place or time.time() - place['resolved_at'] > self.ttl:
+                return None
+            return dict(place)
+
+    def put(self, business_name, location, place_url, reviews_url, business_data):
+        def add(places):
+            places[place_query_key(business_name, location)] = {
+                'place_url': place_url,
+                'reviews_url': reviews_url,
+                'business': business_data,
+                'resolved_at': time.time(),
+            }
+            return True
+        self._update(add)
+
+    def invalidate(self, business_name, location):
+        self._update(lambda places: places.pop(place_query_key(business_name, location), None) is not None)
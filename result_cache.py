@@ -0,0 +1,205 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from jobs import job_key
+from review_store import rating_from_text
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration (overridable through the environment)
+CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 6 * 3600))
+CACHE_STALE_TTL = int(os.environ.get('RESULT_CACHE_STALE_TTL', 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', 256))
+CACHE_STALE_WHILE_REVALIDATE = os.environ.get('RESULT_CACHE_SWR', '1') == '1'
+
+
+def cache_key(business_name, location, selected_stars, since=None):
+    """
+    (business, location, stars) normalized the same way as job keys, plus the date cutoff.
+    """
+    return job_key(business_name, location, selected_stars)[:3] + (since or None,)
+
+
+def covers(entry, wanted, since):
+    """
+    True when the entry holds every review a request for `wanted` stars since `since` returns.
+    """
+    return wanted <= entry.stars and (entry.since is None or (since is not None and entry.since <= since))
+
+
+class CacheEntry:
+    def __init__(self, stars, reviews, summary, since=None):
+        self.stars = frozenset(stars)
+        self.since = since
+        self.reviews = reviews
+        self.summary = summary
+        self.stored_at = time.time()
+
+
+class ResultCache:
+    """
+    TTL + LRU cache of scrape results keyed on the normalized (business, location, stars, since).
+    A request for a subset of star ratings, or with a later date cutoff, is served
+    from any cached superset.
+    Entries older than ttl are "stale" for another stale_ttl seconds: they can be
+    served while a refresh runs in the background.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._keys_by_query = {}
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'superset_hits': 0, 'stale_hits': 0, 'misses': 0, 'evictions': 0, 'refreshes': 0}
+
+    def get(self, business_name, location, selected_stars, since=None):
+        """
+        Returns (reviews, summary, state) where state is 'fresh', 'stale' or None on a miss.
+        """
+        since = since or None
+        query = cache_key(business_name, location, selected_stars)[:2]
+        wanted = frozenset(int(star) for star in selected_stars)
+        now = time.time()
+        with self._lock:
+            best = None
+            for key in self._keys_by_query.get(query, ()):
+                entry = self._entries[key]
+                if covers(entry, wanted, since) and (best is None or entry.stored_at > best[1].stored_at):
+                    best = (key, entry)
+
+            if best is None:
+                self.counters['misses'] += 1
+                return None, None, None
+
+            key, entry = best
+            age = now - entry.stored_at
+            if age >= self.ttl + self.stale_ttl:
+                self._remove(key)
+                self.counters['misses'] += 1
+                return None, None, None
+
+            self._entries.move_to_end(key)
+            state = 'fresh' if age < self.ttl else 'stale'
+            self.counters['hits' if state == 'fresh' else 'stale_hits'] += 1
+            narrower = entry.stars != wanted or entry.since != since
+            if narrower:
+                self.counters['superset_hits'] += 1
+
+        reviews = entry.reviews
+        if narrower:
+            # Same rule as the scrape: a cutoff leaves out reviews without a normalized date
+            reviews = [record for record in reviews
+                       if rating_from_text(record.get("Rating")) in wanted
+                       and (since is None or (record.get("Reviewed On Date") or '') >= since)]
+        return reviews, entry.summary, state
+
+    def put(self, business_name, location, selected_stars, reviews, summary=None, since=None):
+        key = cache_key(business_name, location, selected_stars, since)
+        entry = CacheEntry(key[2], reviews, summary or {}, key[3])
+        query = key[:2]
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._keys_by_query.setdefault(query, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.counters['evictions'] += 1
+
+    def _remove(self, key):
+        # Called with the lock held
+        del self._entries[key]
+        query_keys = self._keys_by_query.get(key[:2])
+        if query_keys is not None:
+            query_keys.discard(key)
+            if not query_keys:
+                del self._keys_by_query[key[:2]]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['stale_hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'hit_rate': round((lookups - self.counters['misses']) / lookups, 3) if lookups else None,
+            }
+
+
+class CachedScraper:
+    """
+    Serves scrape results from a ResultCache and refreshes stale entries in the background.
+    """
+
+    def __init__(self, scrape_func, cache, stale_while_revalidate=CACHE_STALE_WHILE_REVALIDATE):
+        self.scrape_func = scrape_func
+        self.cache = cache
+        self.stale_while_revalidate = stale_while_revalidate
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def scrape(self, business_name, location, selected_stars, on_event=None, refresh=False, **options):
+        """
+        Same signature as the scrape function plus refresh=True to bypass the cache.
+        Incremental scrapes are never cached since their result depends on earlier runs.
+        """
+        cacheable = not options.get('incremental')
+        if cacheable and not refresh:
+            reviews, summary, state = self.cache.get(business_name, location, selected_stars, options.get('since'))
+            if state == 'fresh' or (state == 'stale' and self.stale_while_revalidate):
+                if state == 'stale':
+                    self._refresh_in_background(business_name, location, selected_stars, options)
+                self._replay(reviews, summary, state, on_event)
+                return reviews
+
+        return self._scrape_and_cache(business_name, location, selected_stars, on_event, cacheable, options)
+
+    def _scrape_and_cache(self, business_name, location, selected_stars, on_event, cacheable, options):
+        summary = {}
+        def forward(event):
+            if event['type'] == 'summary':
+                summary.update({key: value for key, value in event.items() if key != 'type'})
+            if on_event is not None:
+                on_event(event)
+
+        reviews = self.scrape_func(business_name, location, selected_stars, on_event=forward, **options)
+        # Only complete scrapes are cached: a failed phase returns no place and cancelled runs are partial
+        if cacheable and summary.get('place_url') and not summary.get('cancelled'):
+            self.cache.put(business_name, location, selected_stars, reviews, summary, options.get('since'))
+        return reviews
+
+    def _replay(self, reviews, summary, state, on_event):
+        if on_event is None:
+            return
+        for record in reviews:
+            on_event({'type': 'review', 'review': record})
+        on_event({'type': 'summary', **summary, 'cache': state})
+
+    def _refresh_in_background(self, business_name, location, selected_stars, options):
+        key = cache_key(business_name, location, selected_stars, options.get('since'))
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self.cache.counters['refreshes'] += 1
+        # The refresh outlives the request, so it must not be stopped by the request's cancel event
+        options = {name: value for name, value in options.items() if name != 'cancel_event'}
+
+        def refresh():
+            try:
+                self._scrape_and_cache(business_name, location, selected_stars, None, True, options)
+            except Exception as e:
+                logger.error(f"Background cache refresh failed for {business_name} ({location}): {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
@@ -0,0 +1,90 @@
+"""
+Relative review dates ("vor 2 Jahren", "3 weeks ago") to approximate absolute dates.
+
+Maps only shows how long ago a review was written, rounded down to one unit:
+"2 months ago" means at least two and less than three months before the scrape.
+A whole batch is converted at once with pandas/NumPy. Each text maps to the latest
+date it can stand for (reviewed_on_date), the range of dates it covers and its
+precision (day, week, month or year). Dates are ISO strings, so they compare and
+filter correctly as text, including in SQLite.
+"""
+import re
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# English "3 weeks ago" / "a year ago" and German "vor 3 Wochen" / "vor einem Jahr", in one pass
+RELATIVE_DATE_PATTERN = re.compile(
+    r'\b(?P<en_amount>\d+|an?|one)\s+(?P<en_unit>minute|hour|day|week|month|year)s?\s+ago\b'
+    r'|\bvor\s+(?P<de_amount>\d+|einem|einer)\s+(?P<de_unit>Minute|Stunde|Tag|Woche|Monat|Jahr)(?:en|n)?\b',
+    re.IGNORECASE,
+)
+AMOUNT_WORDS = {'a': 1, 'an': 1, 'one': 1, 'einem': 1, 'einer': 1}
+UNIT_NAMES = {
+    'minute': 'minute', 'hour': 'hour', 'day': 'day', 'week': 'week', 'month': 'month', 'year': 'year',
+    'stunde': 'hour', 'tag': 'day', 'woche': 'week', 'monat': 'month', 'jahr': 'year',
+}
+# Average length of each unit in days
+UNIT_DAYS = {'minute': 1 / 1440, 'hour': 1 / 24, 'day': 1, 'week': 7, 'month': 30.4375, 'year': 365.25}
+UNIT_PRECISION = {'minute': 'day', 'hour': 'day', 'day': 'day', 'week': 'week', 'month': 'month', 'year': 'year'}
+PRECISIONS = ('day', 'week', 'month', 'year')
+
+DATE_COLUMNS = ['reviewed_on_text', 'reviewed_on_date', 'reviewed_on_earliest', 'reviewed_on_latest',
+                'reviewed_on_precision']
+
+
+def find_relative_date(text):
+    """
+    The relative date inside a longer text such as "4/5 vor 2 Jahren bei Google", or None.
+    """
+    match = RELATIVE_DATE_PATTERN.search(text or '')
+    return match.group(0) if match else None
+
+
+def scrape_anchor():
+    """
+    Today's date (UTC), the day relative dates of a scrape are counted back from.
+    """
+    return datetime.now(timezone.utc).date()
+
+
+def normalize_review_dates(texts, anchor=None):
+    """
+    Convert relative date texts to absolute dates counted back from `anchor` (a date,
+    or one date per text; today by default). Returns a DataFrame with the columns of
+    DATE_COLUMNS, one row per text; texts without a recognizable date get None.
+    """
+    texts = pd.Series(list(texts), dtype='object')
+    frame = pd.DataFrame({column: pd.Series([None] * len(texts), dtype='object') for column in DATE_COLUMNS})
+    frame['reviewed_on_text'] = texts
+    if texts.empty:
+        return frame
+
+    parts = texts.where(texts.notna(), '').astype(str).str.extract(RELATIVE_DATE_PATTERN)
+    amounts = parts['en_amount'].fillna(parts['de_amount']).str.lower()
+    amounts = pd.to_numeric(amounts.replace(AMOUNT_WORDS), errors='coerce').to_numpy(dtype=float)
+    units = parts['en_unit'].fillna(parts['de_unit']).str.lower().map(UNIT_NAMES)
+    unit_days = units.map(UNIT_DAYS).to_numpy(dtype=float)
+    precision = units.map(UNIT_PRECISION)
+
+    valid = ~np.isnan(amounts * unit_days)
+    amounts = np.where(valid, amounts, 0)
+    unit_days = np.where(valid, unit_days, 0)
+    # "n units ago": between n and n + 1 units back; day precision is a single day
+    newest_age = np.floor(amounts * unit_days).astype('int64')
+    coarse = precision.isin(('week', 'month', 'year')).to_numpy()
+    oldest_age = np.where(coarse, np.ceil((amounts + 1) * unit_days).astype('int64') - 1, newest_age)
+
+    if anchor is None:
+        anchor = scrape_anchor()
+    anchors = np.asarray(pd.to_datetime(pd.Series(anchor if np.ndim(anchor) else [anchor] * len(texts)))
+                         .to_numpy(dtype='datetime64[D]'))
+    latest = np.datetime_as_string(anchors - newest_age.astype('timedelta64[D]'), unit='D')
+    earliest = np.datetime_as_string(anchors - oldest_age.astype('timedelta64[D]'), unit='D')
+
+    frame['reviewed_on_date'] = pd.Series(np.where(valid, latest, None), dtype='object')
+    frame['reviewed_on_latest'] = frame['reviewed_on_date']
+    frame['reviewed_on_earliest'] = pd.Series(np.where(valid, earliest, None), dtype='object')
+    frame['reviewed_on_precision'] = pd.Series(np.where(valid, precision.to_numpy(dtype=object), None), dtype='object')
+    return frame
@@ -0,0 +1,274 @@
+import re
+import time
+
+from review_dates import find_relative_date
+
+# In-page review extractor. Walks every div[data-review-id] once and returns
+# plain objects, so a whole batch costs a single WebDriver round-trip.
+# Written as a function expression so it can be evaluated by any driver.
+EXTRACT_REVIEWS_FN = r"""
+(opts) => {
+    opts = opts || {};
+    const textOf = (el) => el ? el.innerText : null;
+    const selector = opts.unpruned_only ? 'div[data-review-id]:not([data-pruned])' : 'div[data-review-id]';
+    let nodes = Array.from(document.querySelectorAll(selector));
+    const count = nodes.length;
+    if (opts.tail) {
+        nodes = nodes.slice(-opts.tail);
+    }
+    const seen = new Set(opts.skip_ids || []);
+    const reviews = [];
+    for (const node of nodes) {
+        const reviewId = node.getAttribute('data-review-id');
+        if (!reviewId || seen.has(reviewId)) {
+            continue;
+        }
+        seen.add(reviewId);
+
+        // Same fallback order as the old per-element lookups:
+        // aria-label stars, then the "x/5" span, then any span with "/5" text
+        const star = node.querySelector('span[aria-label*="star"], span[aria-label*="Stern"]');
+        const numeric = star ? null : node.querySelector('span[class="fzvQIb"]');
+        let slash = null;
+        if (!star && !numeric) {
+            for (const span of node.querySelectorAll('span')) {
+                const ownText = Array.from(span.childNodes).some(
+                    (child) => child.nodeType === Node.TEXT_NODE && child.textContent.includes('/5'));
+                if (ownText) {
+                    slash = span.innerText;
+                    break;
+                }
+            }
+        }
+
+        reviews.push({
+            review_id: reviewId,
+            rating_label: star ? star.getAttribute('aria-label') : null,
+            rating_numeric: textOf(numeric),
+            rating_slash: slash,
+            reviewer: textOf(node.querySelector('div[class*="d4r55"]')),
+            date_text: textOf(node.querySelector('span[class*="rsqaWe"]')),
+            du9pgb_text: textOf(node.querySelector('div[class="DU9Pgb"]')),
+            xrkppb_text: textOf(node.querySelector('span[class="xRkPPb"]')),
+            review_text: textOf(node.querySelector('span[class*="wiI7pd"]')),
+            has_more: !!node.querySelector('button[aria-label*="See more"]')
+        });
+    }
+    return {count: count, reviews: reviews};
+}
+"""
+
+# Clicks the "See more" button of the given reviews in one round-trip
+EXPAND_REVIEWS_FN = r"""
+(reviewIds) => {
+    let clicked = 0;
+    for (const reviewId of reviewIds) {
+        const node = document.querySelector(`div[data-review-id="${CSS.escape(reviewId)}"]`);
+        const button = node && node.querySelector('button[aria-label*="See more"]');
+        if (button) {
+            button.click();
+            clicked++;
+        }
+    }
+    return clicked;
+}
+"""
+
+# Re-reads the review text of the given reviews after expanding them
+READ_REVIEW_TEXTS_FN = r"""
+(reviewIds) => {
+    const texts = {};
+    for (const reviewId of reviewIds) {
+        const node = document.querySelector(`div[data-review-id="${CSS.escape(reviewId)}"]`);
+        const span = node && node.querySelector('span[class*="wiI7pd"]');
+        texts[reviewId] = span ? span.innerText : null;
+    }
+    return texts;
+}
+"""
+
+# Empties the nodes of already extracted reviews. The outer node keeps its id and
+# height, so the scroll position and the list's paging are unaffected while the
+# browser can free the review's subtree (text, avatar, photos).
+PRUNE_REVIEWS_FN = r"""
+(reviewIds) => {
+    let pruned = 0;
+    for (const reviewId of reviewIds) {
+        const node = document.querySelector(`div[data-review-id="${CSS.escape(reviewId)}"]:not([data-pruned])`);
+        if (!node) {
+            continue;
+        }
+        node.style.height = node.offsetHeight + 'px';
+        node.replaceChildren();
+        node.setAttribute('data-pruned', '1');
+        pruned++;
+    }
+    return pruned;
+}
+"""
+
+# Review count per star rating from the histogram rows of the place panel,
+# labelled like "5 stars, 1,234 reviews" or "5 Sterne, 1.234 Rezensionen"
+RATING_HISTOGRAM_FN = r"""
+() => {
+    const counts = {};
+    for (const row of document.querySelectorAll('tr[aria-label]')) {
+        const match = row.getAttribute('aria-label').match(/^\s*([1-5])\D+?([\d.,\u00a0 ]+)\D*$/);
+        if (match) {
+            counts[match[1]] = parseInt(match[2].replace(/\D/g, ''), 10) || 0;
+        }
+    }
+    return counts;
+}
+"""
+
+# Unique review ids of all loaded review nodes, in page order
+REVIEW_IDS_FN = r"""
+() => {
+    const ids = [];
+    const seen = new Set();
+    for (const node of document.querySelectorAll('div[data-review-id]')) {
+        const reviewId = node.getAttribute('data-review-id');
+        if (reviewId && !seen.has(reviewId)) {
+            seen.add(reviewId);
+            ids.push(reviewId);
+        }
+    }
+    return ids;
+}
+"""
+
+LEADING_RATING = re.compile(r'^\d+/\d+\s*')
+OTHER_SOURCES = ["Tripadvisor", "Yelp", "Facebook", "Booking"]
+
+
+def run_script(browser, fn, arg=None):
+    """
+    Evaluate one of the function expressions above with a single execute_script call.
+    """
+    return browser.execute_script(f"return ({fn})(arguments[0]);", arg)
+
+
+def extract_raw_reviews(browser, tail=None, skip_ids=None, unpruned_only=False):
+    """
+    Read all loaded reviews (or only the last `tail` review nodes) in one round-trip.
+    With unpruned_only, nodes emptied by prune_reviews are skipped.
+    Returns a dict with the total node `count` and the list of raw `reviews`.
+    """
+    opts = {'tail': tail, 'skip_ids': list(skip_ids) if skip_ids else [], 'unpruned_only': unpruned_only}
+    return run_script(browser, EXTRACT_REVIEWS_FN, opts)
+
+
+def prune_reviews(browser, review_ids):
+    """
+    Empty the nodes of the given (already extracted) reviews; returns how many were pruned.
+    """
+    if not review_ids:
+        return 0
+    return run_script(browser, PRUNE_REVIEWS_FN, list(review_ids))
+
+
+def read_rating_histogram(browser):
+    """
+    Returns {"1": count, ..., "5": count} from the place panel, or {} when it is not shown.
+    """
+    return browser.execute_script(f"return ({RATING_HISTOGRAM_FN})();") or {}
+
+
+def loaded_review_ids(browser):
+    """
+    Returns the ids of all loaded reviews in page order.
+    """
+    return run_script(browser, REVIEW_IDS_FN)
+
+
+def expand_review_texts(browser, review_ids, pause=0.5):
+    """
+    Click "See more" on the given reviews and return their full texts by review id.
+    """
+    if not review_ids:
+        return {}
+    clicked = run_script(browser, EXPAND_REVIEWS_FN, list(review_ids))
+    if clicked:
+        time.sleep(pause)
+    return run_script(browser, READ_REVIEW_TEXTS_FN, list(review_ids))
+
+
+def parse_rating(raw):
+    """
+    Returns (rating_value, rating_text) for a raw review; rating_value is 0 when unknown.
+    """
+    if raw.get('rating_label') is not None:
+        rating_text = raw['rating_label'].strip()
+        rating_match = re.search(r'(\d+)', rating_text)
+        if rating_match:
+            rating_value = int(rating_match.group(1))
+            return rating_value, f"{rating_value} stars"
+        return 0, rating_text
+
+    if raw.get('rating_numeric') is not None:
+        # Numerical rating format (e.g., 3/5, 4/5)
+        rating_text = raw['rating_numeric'].strip()
+        rating_match = re.search(r'(\d+)/5', rating_text) or re.search(r'(\d+)', rating_text)
+        return (int(rating_match.group(1)) if rating_match else 0), rating_text
+
+    if raw.get('rating_slash') is not None:
+        # Last attempt: any span with rating-like text
+        rating_text = raw['rating_slash'].strip()
+        rating_match = re.search(r'(\d+)/5', rating_text)
+        return (int(rating_match.group(1)) if rating_match else 0), rating_text
+
+    return 0, "N/A"
+
+
+def parse_date_and_source(raw):
+    """
+    Returns (review_date, review_source) for a raw review.
+    Reviews imported from other platforms get their platform name as source.
+    """
+    if raw.get('date_text') is not None:
+        # Standard date format (star-based reviews)
+        return raw['date_text'], "Google"
+
+    if raw.get('du9pgb_text') is not None:
+        # The DU9Pgb div contains rating, date and source info, for example
+        # "2/5 5 years ago on Tripadvisor" or "4/5 a year ago on Google"
+        full_text = raw['du9pgb_text'].strip()
+        normalized_text = ' '.join(full_text.split())
+
+        review_date = find_relative_date(normalized_text)
+
+        if review_date:
+            if "Google" in full_text:
+                return review_date, "Google"
+            for source in OTHER_SOURCES:
+                if source in full_text:
+                    return review_date, source
+            return review_date, "Google"  # Default to Google if no source specified
+
+        # Fallback: split by " on " and strip the leading rating
+        if "ago" in full_text.lower() or "her" in full_text.lower():
+            if " on " in full_text:
+                before_on, source_part = [part.strip() for part in full_text.split(" on ", 1)]
+                date_part = LEADING_RATING.sub('', before_on).strip()
+                if not date_part:
+                    return "Date not found", "Google"
+                if "Google" in source_part:
+                    return date_part, "Google"
+                return date_part, source_part
+            date_part = LEADING_RATING.sub('', full_text).strip()
+            return (date_part if date_part else "Date not found"), "Google"
+        return "Date not found", "Google"
+
+    if raw.get('xrkppb_text') is not None:
+        # Final fallback to the original xRkPPb element
+        date_text = raw['xrkppb_text']
+        if "Google" in date_text:
+            if " on " in date_text:
+                return date_text.split(" on ")[0].strip(), "Google"
+            if " auf " in date_text:
+                return date_text.split(" auf ")[0].strip(), "Google"
+            return date_text.replace("Google", "").strip(), "Google"
+        return "Date not found", "Google"
+
+    return "Date not found", "Google"
@@ -0,0 +1,436 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+
+from review_dates import normalize_review_dates
+from seen_reviews import DATA_DIR
+
+DATABASE_PATH = os.environ.get('REVIEWS_DB_PATH', os.path.join(DATA_DIR, 'reviews.sqlite3'))
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Ratings up to this many stars count as low ratings in the statistics
+LOW_RATING_MAX = 2
+DEFAULT_ROLLING_MONTHS = 3
+# Review ids per lookup of previously stored reviews (below SQLite's parameter limit)
+LOOKUP_CHUNK_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS businesses (
+    id INTEGER PRIMARY KEY,
+    place_url TEXT NOT NULL UNIQUE,
+    name TEXT,
+    average_rating TEXT,
+    total_reviews TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY,
+    business_id INTEGER NOT NULL REFERENCES businesses(id),
+    review_id TEXT NOT NULL,
+    reviewer TEXT,
+    rating INTEGER NOT NULL,
+    rating_text TEXT,
+    reviewed_on TEXT,
+    reviewed_on_date TEXT,
+    reviewed_on_precision TEXT,
+    review_text TEXT,
+    review_link TEXT,
+    scraped_at REAL NOT NULL,
+    UNIQUE (business_id, review_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_reviews_business_rating ON reviews (business_id, rating, id);
+CREATE INDEX IF NOT EXISTS idx_reviews_business_scraped ON reviews (business_id, scraped_at);
+
+-- Stored reviews per business, period and rating, kept up to date by save_scrape so
+-- statistics never scan the reviews. The period is the month of reviewed_on_date, only
+-- its year for year-precision dates and '' when the date is unknown (see stats_period)
+CREATE TABLE IF NOT EXISTS business_rating_stats (
+    business_id INTEGER NOT NULL REFERENCES businesses(id),
+    month TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (business_id, month, rating)
+) WITHOUT ROWID;
+"""
+
+# Columns added after the first release, created on databases that predate them
+MIGRATIONS = [
+    ('reviews', 'reviewed_on_date', 'TEXT'),
+    ('reviews', 'reviewed_on_precision', 'TEXT'),
+]
+# Statements that need the migrated columns, run one by one inside the migration transaction
+POST_MIGRATION_STATEMENTS = [
+    'CREATE INDEX IF NOT EXISTS idx_reviews_business_date ON reviews (business_id, reviewed_on_date)',
+]
+# One-off data migrations, recorded in PRAGMA user_version once they ran:
+# 1 - absolute dates for reviews stored before dates were normalized
+# 2 - business_rating_stats built from the reviews stored before it existed
+# 3 - business_rating_stats rebuilt with year-precision reviews under their year
+DATA_VERSION = 3
+
+
+def review_id_from_link(review_link):
+    """
+    The scraper builds review links as "<place url>?hl=en&review=<review id>".
+    """
+    return parse_qs(urlparse(review_link).query).get('review', [None])[0]
+
+
+def rating_from_text(rating_text):
+    rating_match = re.search(r'(\d+)', rating_text or '')
+    return int(rating_match.group(1)) if rating_match else 0
+
+
+def stats_period(reviewed_on_date, reviewed_on_precision):
+    """
+    Statistics bucket of a review: "YYYY-MM", or "YYYY" when the date is only
+    known to the year ("2 years ago" can fall in any month), '' when unknown.
+    """
+    if not reviewed_on_date:
+        return ''
+    return reviewed_on_date[:4] if reviewed_on_precision == 'year' else reviewed_on_date[:7]
+
+
+class ReviewStore:
+    """
+    Normalized SQLite (WAL mode) storage for scraped businesses and their reviews.
+    Each thread uses its own connection.
+    """
+
+    def __init__(self, path=DATABASE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+
+    def _migrate(self, conn):
+        """
+        Add missing columns, then run the data migrations this database has not
+        seen yet. Columns are checked and added, and the version is checked and
+        bumped, in one write transaction, so when several processes start at once
+        only the first one migrates.
+        """
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for table, column, column_type in MIGRATIONS:
+                columns = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+            for statement in POST_MIGRATION_STATEMENTS:
+                conn.execute(statement)
+
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < 1:
+                self._normalize_stored_dates(conn)
+            if version < 3:
+                self._rebuild_rating_stats(conn)
+            if version < DATA_VERSION:
+                conn.execute(f'PRAGMA user_version = {DATA_VERSION}')
+
+    def _normalize_stored_dates(self, conn):
+        """
+        Fill in absolute dates of reviews stored before dates were normalized,
+        counting back from each review's scrape time. Reviews whose date cannot
+        be parsed keep a NULL date.
+        """
+        rows = conn.execute(
+            'SELECT id, reviewed_on, scraped_at FROM reviews WHERE reviewed_on_date IS NULL AND reviewed_on IS NOT NULL'
+        ).fetchall()
+        if not rows:
+            return
+        dates = normalize_review_dates(
+            [row['reviewed_on'] for row in rows],
+            anchor=[datetime.fromtimestamp(row['scraped_at'], timezone.utc).date() for row in rows],
+        )
+        conn.executemany(
+            'UPDATE reviews SET reviewed_on_date = ?, reviewed_on_precision = ? WHERE id = ?',
+            [(date_row.reviewed_on_date, date_row.reviewed_on_precision, row['id'])
+             for row, date_row in zip(rows, dates.itertuples(index=False)) if date_row.reviewed_on_date],
+        )
+
+    def _rebuild_rating_stats(self, conn):
+        """
+        Recompute business_rating_stats from the stored reviews, replacing what
+        it held (called inside the migration's write transaction).
+        """
+        conn.execute('DELETE FROM business_rating_stats')
+        conn.execute(
+            """
+            INSERT INTO business_rating_stats (business_id, month, rating, count)
+            SELECT business_id,
+                   CASE WHEN reviewed_on_date IS NULL THEN ''
+                        WHEN reviewed_on_precision = 'year' THEN substr(reviewed_on_date, 1, 4)
+                        ELSE substr(reviewed_on_date, 1, 7) END,
+                   rating, COUNT(*)
+            FROM reviews GROUP BY 1, 2, 3
+            """
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    def save_scrape(self, place_url, business_data, records):
+        """
+        Upsert the business and bulk-insert its scraped review records in one transaction.
+        Returns the business id.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO businesses (place_url, name, average_rating, total_reviews, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (place_url) DO UPDATE SET
+                    name = excluded.name,
+                    average_rating = excluded.average_rating,
+                    total_reviews = excluded.total_reviews,
+                    updated_at = excluded.updated_at
+                """,
+                (place_url, business_data.get("Business Name"), business_data.get("Average Rating"),
+                 business_data.get("Total Reviews"), now, now),
+            )
+            business_id = conn.execute('SELECT id FROM businesses WHERE place_url = ?', (place_url,)).fetchone()[0]
+
+            rows = {}
+            for record in records:
+                review_id = review_id_from_link(record.get("Review Link", ""))
+                if not review_id:
+                    continue
+                rows[review_id] = (
+                    business_id, review_id, record.get("Reviewer"), rating_from_text(record.get("Rating")),
+                    record.get("Rating"), record.get("Reviewed On"), record.get("Reviewed On Date"),
+                    record.get("Reviewed On Precision"), record.get("Review Text"), record.get("Review Link"), now,
+                )
+            self._update_rating_stats(conn, business_id, rows)
+            conn.executemany(
+                """
+                INSERT INTO reviews (business_id, review_id, reviewer, rating, rating_text, reviewed_on,
+                                     reviewed_on_date, reviewed_on_precision, review_text, review_link, scraped_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (business_id, review_id) DO UPDATE SET
+                    reviewer = excluded.reviewer,
+                    rating = excluded.rating,
+                    rating_text = excluded.rating_text,
+                    reviewed_on = excluded.reviewed_on,
+                    reviewed_on_date = excluded.reviewed_on_date,
+                    reviewed_on_precision = excluded.reviewed_on_precision,
+                    review_text = excluded.review_text,
+                    review_link = excluded.review_link,
+                    scraped_at = excluded.scraped_at
+                """,
+                list(rows.values()),
+            )
+        return business_id
+
+    def _update_rating_stats(self, conn, business_id, rows):
+        """
+        Apply a batch of review rows (by review id, about to be upserted) to the
+        business's rating statistics: stored reviews that are updated move out of
+        their old (period, rating) bucket. Costs one indexed lookup per batch chunk.
+        """
+        deltas = {}
+        for row in rows.values():
+            key = (stats_period(row[6], row[7]), row[3])
+            deltas[key] = deltas.get(key, 0) + 1
+
+        review_ids = list(rows)
+        for start in range(0, len(review_ids), LOOKUP_CHUNK_SIZE):
+            chunk = review_ids[start:start + LOOKUP_CHUNK_SIZE]
+            stored = conn.execute(
+                f"SELECT rating, reviewed_on_date, reviewed_on_precision FROM reviews WHERE business_id = ? "
+                f"AND review_id IN ({', '.join('?' for _ in chunk)})",
+                [business_id] + chunk,
+            )
+            for row in stored:
+                key = (stats_period(row['reviewed_on_date'], row['reviewed_on_precision']), row['rating'])
+                deltas[key] = deltas.get(key, 0) - 1
+
+        changes = [(business_id, period, rating, delta) for (period, rating), delta in deltas.items() if delta]
+        if not changes:
+            return
+        conn.executemany(
+            """
+            INSERT INTO business_rating_stats (business_id, month, rating, count) VALUES (?, ?, ?, ?)
+            ON CONFLICT (business_id, month, rating) DO UPDATE SET count = count + excluded.count
+            """,
+            changes,
+        )
+        conn.execute('DELETE FROM business_rating_stats WHERE business_id = ? AND count <= 0', (business_id,))
+
+    def get_business(self, business_id):
+        row = self._connect().execute('SELECT * FROM businesses WHERE id = ?', (business_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _review_filter(self, business_id, stars, since=None, until=None):
+        """
+        WHERE clause for a business's reviews with the given stars and a reviewed_on_date
+        between `since` and `until` (ISO dates, both inclusive). Reviews without a
+        normalized date are left out by a date filter.
+        """
+        clause = 'business_id = ?'
+        params = [business_id]
+        if stars:
+            clause += f" AND rating IN ({', '.join('?' for _ in stars)})"
+            params.extend(stars)
+        if since:
+            clause += ' AND reviewed_on_date >= ?'
+            params.append(str(since))
+        if until:
+            clause += ' AND reviewed_on_date <= ?'
+            params.append(str(until))
+        return clause, params
+
+    def get_reviews_page(self, business_id, stars=None, cursor=None, limit=DEFAULT_PAGE_SIZE, since=None, until=None):
+        """
+        Keyset-paginated reviews of a business, optionally filtered by star rating and date.
+        Returns (reviews, next_cursor); next_cursor is None on the last page.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clause, params = self._review_filter(business_id, stars, since, until)
+        if cursor:
+            clause += ' AND id > ?'
+            params.append(int(cursor))
+        rows = self._connect().execute(
+            f'SELECT * FROM reviews WHERE {clause} ORDER BY id LIMIT ?', params + [limit + 1]
+        ).fetchall()
+        next_cursor = str(rows[limit - 1]['id']) if len(rows) > limit else None
+        return [dict(row) for row in rows[:limit]], next_cursor
+
+    def iter_review_records(self, business_id, stars=None, batch_size=1000, since=None, until=None):
+        """
+        Yield all stored reviews of a business as scraper-style records (with the
+        business columns), reading the database in batches.
+        """
+        business = self.get_business(business_id)
+        clause, params = self._review_filter(business_id, stars, since, until)
+        cursor = self._connect().execute(f'SELECT * FROM reviews WHERE {clause} ORDER BY id', params)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield {
+                        "Business Name": business['name'],
+                        "Average Rating": business['average_rating'],
+                        "Total Reviews": business['total_reviews'],
+                        **review_row_to_record(row),
+                    }
+        finally:
+            cursor.close()
+
+    def rating_counts(self, business_id, stars=None, since=None, until=None):
+        clause, params = self._review_filter(business_id, stars, since, until)
+        rows = self._connect().execute(
+            f'SELECT rating, COUNT(*) AS count FROM reviews WHERE {clause} GROUP BY rating', params
+        ).fetchall()
+        return {row['rating']: row['count'] for row in rows}
+
+    def rating_stats(self, business_id, window=DEFAULT_ROLLING_MONTHS):
+        """
+        Rating statistics of a business's stored reviews, read from the maintained
+        aggregates (see summarize_rating_stats).
+        """
+        rows = self._connect().execute(
+            'SELECT month, rating, count FROM business_rating_stats WHERE business_id = ?', (business_id,)
+        ).fetchall()
+        return summarize_rating_stats([(row['month'], row['rating'], row['count']) for row in rows], window)
+
+
+def _month_range(first, last):
+    year, month = int(first[:4]), int(first[5:7])
+    while f'{year:04d}-{month:02d}' <= last:
+        yield f'{year:04d}-{month:02d}'
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _rating_summary(counts):
+    total = sum(counts.values())
+    rating_sum = sum(rating * count for rating, count in counts.items())
+    low = sum(count for rating, count in counts.items() if rating <= LOW_RATING_MAX)
+    return {
+        'reviews_count': total,
+        'average_rating': round(rating_sum / total, 3) if total else None,
+        'low_rating_share': round(low / total, 3) if total else None,
+    }
+
+
+def summarize_rating_stats(rows, window=DEFAULT_ROLLING_MONTHS):
+    """
+    Totals, star histogram and a monthly trend from (period, rating, count) rows
+    (see stats_period). Every calendar month between the first and last dated
+    review is listed, with the average over the trailing `window` months next to
+    the month's own average. Reviews without a normalized date, and those only
+    dated to the year, count towards the totals but not the monthly trend.
+    """
+    window = max(1, int(window))
+    histogram = {rating: 0 for rating in range(1, 6)}
+    by_month = {}
+    year_only = 0
+    for period, rating, count in rows:
+        histogram[rating] = histogram.get(rating, 0) + count
+        if len(period) == 7:
+            by_month.setdefault(period, {})
+            by_month[period][rating] = by_month[period].get(rating, 0) + count
+        elif period:
+            year_only += count
+
+    monthly = []
+    if by_month:
+        months = list(_month_range(min(by_month), max(by_month)))
+        for index, month in enumerate(months):
+            trailing = {}
+            for previous in months[max(0, index - window + 1):index + 1]:
+                for rating, count in by_month.get(previous, {}).items():
+                    trailing[rating] = trailing.get(rating, 0) + count
+            rolling = _rating_summary(trailing)
+            monthly.append({
+                'month': month,
+                **_rating_summary(by_month.get(month, {})),
+                'rolling_average_rating': rolling['average_rating'],
+                'rolling_low_rating_share': rolling['low_rating_share'],
+            })
+
+    return {
+        **_rating_summary(histogram),
+        'rating_histogram': histogram,
+        'undated_reviews_count': sum(count for period, _, count in rows if not period),
+        'year_precision_reviews_count': year_only,
+        'low_rating_max': LOW_RATING_MAX,
+        'rolling_window_months': window,
+        'monthly': monthly,
+    }
+
+
+def review_row_to_record(row):
+    """
+    Shape a stored review like the records returned by the scraper (without the business columns).
+    """
+    return {
+        "Review ID": row['review_id'],
+        "Reviewer": row['reviewer'],
+        "Rating": row['rating_text'],
+        "Reviewed On": row['reviewed_on'],
+        "Reviewed On Date": row['reviewed_on_date'],
+        "Reviewed On Precision": row['reviewed_on_precision'],
+        "Review Text": row['review_text'],
+        "Review Link": row['review_link'],
+    }
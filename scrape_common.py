@@ -0,0 +1,198 @@
+"""
+Browser-independent parts of a scrape, shared by the Selenium scraper (scraper.py)
+and the asyncio backend in async_scraper: progress events, the
+business overview, picking the wanted reviews from raw batches and building
+the review records.
+"""
+import logging
+import threading
+import time
+
+from review_dates import normalize_review_dates
+from review_extraction import parse_rating, parse_date_and_source
+from sort_strategy import past_wanted_range
+
+logger = logging.getLogger(__name__)
+
+# Consecutive reviews past the wanted ratings of a sorted pass that end it
+MAX_OUT_OF_RANGE = 5
+
+
+def emit_event(on_event, event_type, **fields):
+    """
+    Forward a progress event to the caller's callback.
+    A failing callback must never break the scrape itself.
+    """
+    if on_event is None:
+        return
+    try:
+        on_event({'type': event_type, **fields})
+    except Exception as e:
+        logger.warning(f"Error in progress callback: {e}")
+
+
+def is_cancelled(cancel_event):
+    return cancel_event is not None and cancel_event.is_set()
+
+
+class ScrapeDeadline:
+    """
+    A cancel_event that also counts as set once `seconds` have passed, so a
+    scrape returns its partial results before the server times the request out.
+    """
+
+    def __init__(self, seconds, cancel_event=None):
+        self.expires_at = time.monotonic() + seconds
+        self.cancel_event = cancel_event or threading.Event()
+
+    def set(self):
+        self.cancel_event.set()
+
+    def is_set(self):
+        return self.cancel_event.is_set() or time.monotonic() >= self.expires_at
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+
+def business_overview(texts, business_name_input, rating_histogram):
+    """
+    Business fields from the overview texts found per OVERVIEW_SELECTORS group
+    (None for groups that were not found) and the rating histogram.
+    """
+    business_data = {}
+    for group, field, fallback in [('business_name', "Business Name", business_name_input),
+                                   ('average_rating', "Average Rating", "N/A"),
+                                   ('total_reviews', "Total Reviews", "N/A")]:
+        text = texts.get(group)
+        if text:
+            business_data[field] = text
+            logger.debug(f"  - {field}: {text}")
+        else:
+            logger.warning(f"  - Could not find {field.lower()}")
+            business_data[field] = fallback
+
+    business_data["Price Level"] = "N/A"
+    business_data["Price Range"] = "N/A"
+    # Review count per star rating, used to plan the sort order
+    business_data["Rating Histogram"] = rating_histogram
+    return business_data
+
+
+class ReviewSelector:
+    """
+    Picks the reviews of one scrape from raw review batches: wanted star ratings,
+    Google as source, not seen before and (with since) not before the date cutoff.
+    Also tracks when the current sorted pass can stop.
+    """
+
+    def __init__(self, known_review_ids=(), since=None, scrape_date=None, cancel_event=None):
+        self.known_review_ids = known_review_ids
+        self.since = since
+        self.scrape_date = scrape_date
+        self.cancel_event = cancel_event
+        self.processed_review_ids = set()
+        self.current_pass = None
+        self.consecutive_out_of_range = 0  # Consecutive ratings past the wanted range of a sorted pass
+        self.extraction_stopped = False
+        self.date_cutoff_reached = False  # A review before `since` was read in newest-first order
+
+    def start_pass(self, planned_pass):
+        self.current_pass = planned_pass
+        self.consecutive_out_of_range = 0
+        self.extraction_stopped = False
+        self.date_cutoff_reached = False
+
+    def select(self, raw_reviews):
+        """
+        Filter raw reviews by rating and source; returns (raw, rating_text, review_date) tuples.
+        Reviews past the range of the current sorted pass are left for a later pass.
+        """
+        selected_raw_reviews = []
+        if self.since:
+            # Absolute dates of the whole batch, to drop reviews before the cutoff
+            batch_dates = normalize_review_dates([parse_date_and_source(raw)[0] for raw in raw_reviews],
+                                                 anchor=self.scrape_date)['reviewed_on_date'].tolist()
+        for index, raw in enumerate(raw_reviews):
+            if is_cancelled(self.cancel_event):
+                logger.info("Scrape cancelled during extraction; returning the reviews extracted so far.")
+                break
+            try:
+                review_id = raw['review_id']
+                if review_id in self.processed_review_ids or review_id in self.known_review_ids:
+                    continue
+
+                # Reviews before the cutoff (or without a readable date) are left out, not marked as seen
+                if self.since and (batch_dates[index] is None or batch_dates[index] < self.since):
+                    if batch_dates[index] is not None:
+                        self.date_cutoff_reached = True
+                    continue
+
+                rating_value, rating_text = parse_rating(raw)
+
+                # Skip review if no rating found
+                if rating_value == 0:
+                    self.processed_review_ids.add(review_id)
+                    continue
+
+                # Early stopping logic when sorted by rating
+                if past_wanted_range(self.current_pass, rating_value):
+                    self.consecutive_out_of_range += 1
+                    logger.debug("Found %s-star review (outside %s). Consecutive: %s",
+                                 rating_value, self.current_pass['stars'], self.consecutive_out_of_range)
+
+                    # Stop if we see 5 consecutive reviews past the wanted ratings
+                    if self.consecutive_out_of_range >= MAX_OUT_OF_RANGE:
+                        logger.info(f"Stopping extraction: Found {self.consecutive_out_of_range} consecutive reviews "
+                                    f"outside {self.current_pass['stars']}")
+                        self.extraction_stopped = True
+                        break
+                    else:
+                        continue  # Skip this review but don't stop yet
+                else:
+                    self.consecutive_out_of_range = 0  # Reset counter
+                self.processed_review_ids.add(review_id)
+
+                if rating_value in self.current_pass['stars']:
+                    review_date, review_source = parse_date_and_source(raw)
+
+                    # Skip the review if it's not from Google
+                    if review_source != "Google":
+                        logger.debug("Skipping %s review: %s", review_source, review_id)
+                        continue
+
+                    selected_raw_reviews.append((raw, rating_text, review_date))
+
+            except Exception as e:
+                logger.warning(f"Error processing one review: {e}")
+        return selected_raw_reviews
+
+
+def build_review_records(selected_raw_reviews, expanded_texts, business_data, base_url, scrape_date):
+    """
+    Records of the selected (raw, rating_text, review_date) reviews, with the full
+    texts of expanded reviews and absolute dates normalized for the whole batch.
+    """
+    review_dates = normalize_review_dates([review_date for _, _, review_date in selected_raw_reviews],
+                                          anchor=scrape_date)
+    records = []
+    for (raw, rating_text, review_date), normalized_date in zip(selected_raw_reviews,
+                                                                review_dates.itertuples(index=False)):
+        review_id = raw['review_id']
+        review_text_content = expanded_texts.get(review_id)
+        if review_text_content is None:
+            review_text_content = raw['review_text'] if raw['review_text'] is not None else "N/A"
+        records.append({
+            "Business Name": business_data.get("Business Name", "N/A"),
+            "Average Rating": business_data.get("Average Rating", "N/A"),
+            "Total Reviews": business_data.get("Total Reviews", "N/A"),
+            "Reviewer": raw['reviewer'] if raw['reviewer'] is not None else "N/A",
+            "Rating": rating_text,
+            "Reviewed On": review_date,
+            "Reviewed On Date": normalized_date.reviewed_on_date,
+            "Reviewed On Precision": normalized_date.reviewed_on_precision,
+            "Review Text": review_text_content,
+            "Review Link": f"{base_url}?hl=en&review={review_id}"
+        })
+    return records
@@ -0,0 +1,699 @@
+"""
+The Selenium scraper and the resources its scrapes share in one process: the
+review stores, place and selector caches, the Chrome driver pool, admission
+control, the asyncio backend and the tab scheduler.
+
+Importing this module starts nothing. init_scraper() builds the shared
+resources once per process: the web app calls it on startup and every batch
+worker process calls it for its own single Chrome. Spawned batch workers can
+therefore import the scraper without launching the web app's browsers, reaper
+and stores a second time.
+"""
+import atexit
+import logging
+import os
+import re
+import threading
+import time
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
+
+from driver_pool import DriverPool, start_orphan_reaper, POOL_SIZE
+from admission import AdmissionController, ASYNC_WEIGHT, QUEUE_TIMEOUT as ADMISSION_QUEUE_TIMEOUT
+from place_cache import PlaceCache
+from selector_registry import SelectorRegistry
+from sort_strategy import sort_pass, plan_sort_passes, past_wanted_range
+from maps_page import (OVERVIEW_SELECTORS, REVIEWS_TAB_SELECTORS, SORT_BUTTON_SELECTORS, REVIEW_AREA_SELECTORS,
+                       SORT_MENU_OPTIONS, NAVIGATION_READY_SELECTORS, COOKIE_ACCEPT_XPATH,
+                       search_url as maps_search_url)
+from scrape_common import (emit_event, is_cancelled, business_overview, ReviewSelector,
+                           build_review_records)
+from network_capture import EXTRACTION_STRATEGY, EXTRACTION_STRATEGIES, NetworkReviewCollector
+from lean_mode import (LEAN_MODE_DEFAULT, LeanModeStats, enable_lean_mode, disable_lean_mode, start_page_stats,
+                       page_transfer_stats, lean_extraction_ok)
+from metrics import (timed_events, SCROLL_ATTEMPTS, SCROLL_BATCH_SECONDS, WEBDRIVER_COMMANDS, SCRAPES,
+                     REVIEWS_EXTRACTED, EARLY_STOPS)
+from seen_reviews import SeenReviewStore
+from review_store import ReviewStore
+from review_dates import normalize_review_dates, scrape_anchor
+from review_extraction import (extract_raw_reviews, expand_review_texts, loaded_review_ids, prune_reviews, parse_rating,
+                               parse_date_and_source, read_rating_histogram)
+from scroll_loader import (count_review_nodes, scroll_and_wait, start_scroll, wait_for_review_nodes, wait_for_dom_quiet,
+                           wait_for_any, PRUNE_DOM_DEFAULT, PRUNE_DOM_MIN_REVIEWS, SCROLL_IDLE_TIMEOUT)
+from tab_scheduler import TabScheduler, TABS_PER_BROWSER, run_steps
+from async_scraper import ASYNC_BACKEND_AVAILABLE, SCRAPER_BACKEND, AsyncScraper, AsyncScrapeRunner
+
+logger = logging.getLogger(__name__)
+
+# Launch the pool's drivers right away instead of on first use (overridable through the environment)
+PREWARM = os.environ.get('CHROME_POOL_PREWARM', '1') == '1'
+
+# Review ids already scraped per place, used by incremental scrapes
+seen_review_store = None
+# Scraped businesses and reviews, served by /businesses/<id>/reviews
+review_store = None
+# Resolved place URLs per query, so repeat scrapes skip the Maps search
+place_cache = None
+# Which fallback selector currently works for each page element
+selector_registry = None
+# Bytes and scroll timings per page mode, and the guard that turns lean mode off if it breaks extraction
+lean_mode_stats = None
+# Warm Chrome drivers shared by all scrapes of this process
+driver_pool = None
+# Caps concurrent browser work by host memory and CPU; the excess queues, then gets 429
+admission = None
+# Asyncio backend ("backend": "async"): its scrapes share one event loop and one Chromium
+async_runner = None
+# Several businesses in the tabs of one driver (batch runs with tabs > 1)
+tab_scheduler = None
+
+_init_lock = threading.Lock()
+
+def init_scraper(pool_size=POOL_SIZE, prewarm=PREWARM, tabs_per_browser=TABS_PER_BROWSER, reap_orphans=True):
+    """
+    Build the shared resources of this process; later calls return right away.
+    Batch workers pass reap_orphans=False and leave the sweeps to their parent process.
+    """
+    global seen_review_store, review_store, place_cache, selector_registry, lean_mode_stats
+    global driver_pool, admission, async_runner, tab_scheduler
+    with _init_lock:
+        if driver_pool is not None:
+            return
+        seen_review_store = SeenReviewStore()
+        review_store = ReviewStore()
+        place_cache = PlaceCache()
+        selector_registry = SelectorRegistry()
+        lean_mode_stats = LeanModeStats()
+
+        driver_pool = DriverPool(size=pool_size)
+        if prewarm:
+            driver_pool.prewarm()
+        atexit.register(driver_pool.shutdown)
+        # Kill Chrome processes left behind by crashed workers or failed quits, now and periodically
+        if reap_orphans:
+            start_orphan_reaper()
+        admission = AdmissionController()
+
+        async_runner = AsyncScrapeRunner(AsyncScraper(place_cache, selector_registry, seen_review_store))
+        atexit.register(async_runner.shutdown)
+        tab_scheduler = TabScheduler(scrape_and_store_steps, driver_pool, max_tabs=tabs_per_browser,
+                                     admission=admission)
+
+def check_early_stop_condition(browser, planned_pass):
+    """
+    Check if we should stop scrolling early based on rating patterns.
+    Returns True if we should stop, False if we should continue.
+    """
+    try:
+        # Read the last 5 review nodes (and the total count) in one round-trip
+        batch = extract_raw_reviews(browser, tail=5)
+        if batch['count'] < 10:
+            return False
+        
+        ratings_found = []
+        for raw in batch['reviews']:
+            rating_value, _ = parse_rating(raw)
+            if rating_value > 0:
+                ratings_found.append(rating_value)
+        
+        if not ratings_found:
+            return False
+        
+        # If all recent reviews are past the wanted ratings in the sorted order, stop
+        if all(past_wanted_range(planned_pass, rating) for rating in ratings_found):
+            logger.info(f"Early stop condition met: Recent ratings {ratings_found} are all outside {planned_pass['stars']}")
+            return True
+        
+        return False
+        
+    except Exception as e:
+        logger.warning(f"Error in early stop check: {e}")
+        return False
+
+def reached_date_cutoff(browser, since, anchor):
+    """
+    With reviews sorted newest first: True once the last loaded reviews are older
+    than `since` (YYYY-MM-DD), so every review still to load is older too.
+    """
+    try:
+        batch = extract_raw_reviews(browser, tail=3)
+        dates = normalize_review_dates([parse_date_and_source(raw)[0] for raw in batch['reviews']], anchor=anchor)
+        known_dates = [review_date for review_date in dates['reviewed_on_date'] if review_date]
+        if known_dates and min(known_dates) < since:
+            logger.info(f"Date cutoff reached: loaded reviews go back to {min(known_dates)}, before {since}")
+            return True
+        return False
+    except Exception as e:
+        logger.warning(f"Error in date cutoff check: {e}")
+        return False
+
+def sort_reviews(browser, sort_order):
+    """
+    Open the reviews "Sort" menu and pick the given order (see SORT_MENU_OPTIONS).
+    Returns True if the reviews were re-sorted, False to continue with default sorting.
+    """
+    try:
+        logger.info(f"Attempting to sort reviews by '{sort_order}'...")
+        sort_button = selector_registry.find(browser, 'sort_button', SORT_BUTTON_SELECTORS, timeout=3, visible=True)
+        if not sort_button:
+            logger.warning("Could not find sort button with any selector")
+            return False
+
+        sort_button.click()
+        logger.debug("Clicked Sort/Most Relevant button.")
+        
+        # Click the sort option by its position in the action menu
+        option_button = WebDriverWait(browser, 4).until(
+            EC.element_to_be_clickable((By.XPATH, f'//*[@id="action-menu"]/div[{SORT_MENU_OPTIONS[sort_order]}]'))
+        )
+        option_button.click()
+        logger.info(f"Selected '{sort_order}' sort option.")
+        # Wait for the re-sorted list to finish rendering
+        wait_for_dom_quiet(browser, timeout=3)
+        return True
+        
+    except Exception as e:
+        logger.warning(f"Could not sort by '{sort_order}' (will continue with default sorting): {e}")
+        return False
+
+def extract_business_overview(browser, business_name_input):
+    """
+    Read name, average rating and total reviews from the place overview panel.
+    """
+    try:
+        logger.debug("Extracting business overview...")
+        found = selector_registry.find_all(browser, OVERVIEW_SELECTORS, timeout=4)
+        return business_overview({group: text for group, (_, text) in found.items()}, business_name_input,
+                                 read_rating_histogram(browser))
+    except Exception as e:
+        logger.warning(f"Could not extract all business overview details: {e}")
+        return {"Business Name": business_name_input}
+
+def open_reviews_tab(browser):
+    """
+    Click the "Reviews" tab of the place panel and wait for the first reviews.
+    Returns False when the tab could not be found or clicked.
+    """
+    try:
+        review_button = selector_registry.find(browser, 'reviews_tab', REVIEWS_TAB_SELECTORS, timeout=3, visible=True)
+        if not review_button:
+            logger.warning("Could not find or click the Reviews button/tab.")
+            return False
+        review_button.click()
+        logger.debug("Clicked on Reviews tab.")
+        wait_for_review_nodes(browser, timeout=3)
+        return True
+    except Exception as e:
+        logger.warning(f"Error clicking reviews tab: {e}")
+        return False
+
+def scrape_google_maps_reviews(business_name_input, location_input, selected_stars, on_event=None, **options):
+    """
+    Scrape the Google Maps reviews of a business with the selected star ratings.
+    In incremental mode reviews are read newest first, scrolling stops at the first
+    batch of already known review ids, and only new reviews are returned.
+    Setting cancel_event (a threading.Event) stops scrolling and extraction early;
+    the reviews extracted so far are returned.
+    Lean mode blocks images, map tiles, fonts and media and shrinks the viewport.
+    extraction='network' reads reviews from the Maps review responses and only uses
+    the rendered DOM for reviews that were not captured.
+    With prune_dom every loaded batch is extracted during scrolling and its nodes
+    are emptied, so browser memory stays flat; None enables it for places with at
+    least PRUNE_DOM_MIN_REVIEWS reviews.
+    With since (YYYY-MM-DD) only reviews from that date on are returned: they are
+    read newest first and scrolling stops at the first review before the cutoff.
+    """
+    return run_steps(scrape_steps(business_name_input, location_input, selected_stars, on_event=on_event, **options))
+
+def scrape_steps(business_name_input, location_input, selected_stars, on_event=None, incremental=False,
+                 cancel_event=None, lean=LEAN_MODE_DEFAULT, extraction=EXTRACTION_STRATEGY,
+                 prune_dom=PRUNE_DOM_DEFAULT, since=None, tab=None):
+    """
+    The scrape of scrape_google_maps_reviews as a generator that returns the reviews.
+    Without a tab it leases its own driver and never yields. With tab (a BrowserTab
+    of a driver shared through TabScheduler) it yields after starting each scroll,
+    so the scheduler can run other tabs while the next batch loads.
+    """
+    search_url = maps_search_url(business_name_input, location_input)
+    # Relative review dates ("2 weeks ago") are counted back from the scrape date
+    scrape_date = scrape_anchor()
+    all_reviews = []
+    business_data = {}
+
+    # Time every phase of this scrape for /metrics
+    on_event, phase_timer = timed_events(on_event)
+
+    logger.info(f"Starting scraping for: {business_name_input} in {location_input}")
+    logger.debug(f"Search URL: {search_url}")
+
+    # Lease a warm Chrome driver from the pool instead of launching a new one
+    emit_event(on_event, 'phase', phase='driver')
+    if tab is not None:
+        driver = tab.driver
+    else:
+        try:
+            driver = driver_pool.acquire()
+            logger.debug("✅ Chrome driver leased from pool")
+        except Exception as e:
+            logger.error(f"❌ Chrome driver creation failed: {e}")
+            phase_timer.finish()
+            SCRAPES.inc(outcome='failed')
+            return []
+    browser = driver.browser
+
+    discard_driver = False
+    outcome = 'failed'
+    commands_at_start = browser.command_count
+    scroll_attempts = 0
+    try:
+        lean = lean and lean_mode_stats.allowed()
+        if lean:
+            try:
+                enable_lean_mode(browser)
+                driver.lean = True
+                logger.info("Lean mode: blocking images, map tiles, fonts and media")
+            except Exception as e:
+                logger.warning(f"Could not enable lean mode, continuing without it: {e}")
+                lean = False
+
+        collector = None
+        if extraction == 'network' and tab is not None:
+            # The performance log is shared by all tabs of a driver
+            logger.info("Network extraction is not available in tabs of a shared driver; extracting from the DOM.")
+        elif extraction not in EXTRACTION_STRATEGIES:
+            logger.warning(f"Unknown extraction strategy '{extraction}', extracting from the DOM.")
+        elif extraction == 'network' and not driver.network_capture:
+            logger.info("Network extraction needs drivers launched with CHROME_NETWORK_CAPTURE=1; "
+                        "extracting from the DOM.")
+        elif extraction == 'network':
+            try:
+                collector = NetworkReviewCollector(browser)
+            except Exception as e:
+                logger.warning(f"Network capture unavailable, extracting from the DOM: {e}")
+
+        # Navigate to Google Maps: straight to the reviews of an already resolved place, otherwise search
+        place = place_cache.get(business_name_input, location_input)
+        emit_event(on_event, 'phase', phase='navigate')
+        try:
+            browser.get(place['reviews_url'] if place else search_url)
+            # Continue as soon as the place, the result list, the reviews or the consent form is rendered
+            wait_for_any(browser, NAVIGATION_READY_SELECTORS, timeout=4)
+            start_page_stats(browser)
+            logger.debug("✅ Successfully navigated to Google Maps")
+        except Exception as e:
+            logger.error(f"❌ Failed to navigate to Google Maps: {e}")
+            discard_driver = True
+            return []
+
+        # Accept cookies if present (a reused driver keeps its consent cookies)
+        if not driver.cookies_accepted:
+            emit_event(on_event, 'phase', phase='cookies')
+            try:
+                accept_button = WebDriverWait(browser, 3).until(
+                    EC.element_to_be_clickable((By.XPATH, COOKIE_ACCEPT_XPATH))
+                )
+                accept_button.click()
+                logger.info("Accepted cookies.")
+                wait_for_dom_quiet(browser, timeout=1)
+            except (TimeoutException, NoSuchElementException):
+                logger.debug("No cookie prompt found or already accepted.")
+            driver.cookies_accepted = True
+
+        if is_cancelled(cancel_event):
+            logger.info("Scrape cancelled before the reviews were opened.")
+            outcome = 'cancelled'
+            emit_event(on_event, 'summary', cancelled=True)
+            return []
+
+        base_url = None
+        if place:
+            emit_event(on_event, 'phase', phase='reviews_tab')
+            if wait_for_review_nodes(browser, timeout=3)['count'] or open_reviews_tab(browser):
+                logger.info(f"✅ Opened reviews of cached place: {place['place_url']}")
+                base_url = place['place_url']
+                reviews_url = place['reviews_url']
+                business_data = dict(place['business'])
+            else:
+                logger.warning("Cached place did not open its reviews; resolving it through search again.")
+                place_cache.invalidate(business_name_input, location_input)
+                try:
+                    browser.get(search_url)
+                    wait_for_any(browser, NAVIGATION_READY_SELECTORS, timeout=4)
+                except Exception as e:
+                    logger.error(f"❌ Failed to navigate to Google Maps: {e}")
+                    discard_driver = True
+                    return []
+
+        if base_url is None:
+            # Extract business overview information
+            emit_event(on_event, 'phase', phase='overview')
+            business_data = extract_business_overview(browser, business_name_input)
+
+            # Click "Reviews" tab
+            emit_event(on_event, 'phase', phase='reviews_tab')
+            if not open_reviews_tab(browser):
+                return []
+            reviews_url = browser.current_url
+            base_url = reviews_url.split('?')[0]
+            place_cache.put(business_name_input, location_input, base_url, reviews_url, business_data)
+
+        # Regression guard: blocked resources must not cost any review fields
+        if lean:
+            extraction_ok = lean_extraction_ok(browser)
+            lean_mode_stats.record_check(extraction_ok)
+            if not extraction_ok:
+                logger.warning("Lean mode: loaded reviews are missing fields; reloading them without request blocking.")
+                disable_lean_mode(browser)
+                driver.lean = False
+                lean = False
+                browser.get(reviews_url)
+                if not (wait_for_review_nodes(browser, timeout=5)['count'] or open_reviews_tab(browser)):
+                    return []
+
+        known_review_ids = seen_review_store.load(base_url) if incremental else set()
+        if incremental:
+            logger.info(f"Incremental mode: {len(known_review_ids)} reviews already known for this place.")
+
+        # Plan the review order: newest first for incremental and date-limited scrapes,
+        # otherwise the sorted pass(es) expected to load the fewest reviews for the selected stars
+        if incremental or since:
+            sort_passes = [sort_pass('newest', selected_stars)]
+        else:
+            sort_passes = plan_sort_passes(selected_stars, business_data.get("Rating Histogram"))
+        logger.info(f"Sort plan: {sort_passes}")
+
+        # Extract each batch while scrolling and empty its nodes on huge places (or when asked to)
+        if prune_dom is None:
+            prune_dom = parse_review_total(business_data.get("Total Reviews")) >= PRUNE_DOM_MIN_REVIEWS
+
+        extracted_count = 0
+        selector = ReviewSelector(known_review_ids, since, scrape_date, cancel_event)
+
+        def add_records(selected_raw_reviews):
+            """
+            Expand truncated texts of the selected reviews in one batch and emit their records.
+            """
+            nonlocal extracted_count
+            try:
+                expanded_texts = expand_review_texts(
+                    browser, [raw['review_id'] for raw, _, _ in selected_raw_reviews if raw['has_more']]
+                )
+            except Exception as e:
+                logger.warning(f"Could not expand truncated reviews: {e}")
+                expanded_texts = {}
+
+            for record in build_review_records(selected_raw_reviews, expanded_texts, business_data, base_url,
+                                               scrape_date):
+                all_reviews.append(record)
+                extracted_count += 1
+                emit_event(on_event, 'review', review=record)
+
+        def extract_and_prune():
+            """
+            Extract the reviews that are not pruned yet, then empty their nodes.
+            Returns the review node count afterwards, the baseline for the next scroll.
+            """
+            batch_raw_reviews = read_unpruned_reviews(browser, collector)
+            add_records(selector.select(batch_raw_reviews))
+            prune_reviews(browser, [raw['review_id'] for raw in batch_raw_reviews])
+            return count_review_nodes(browser)
+
+        scroll_batches = 0
+        scroll_batch_ms = 0
+
+        def scroll_and_extract(early_stop, date_stop=False):
+            """
+            Scroll through the reviews in the current order and extract them.
+            early_stop stops after the wanted ratings of a rating-sorted pass, date_stop
+            at the date cutoff of a newest-first pass.
+            Returns False when the review list could not be found; yields while a batch
+            loads in tab mode.
+            """
+            nonlocal scroll_batches, scroll_batch_ms, scroll_attempts
+            # Scroll through reviews with smart stopping
+            emit_event(on_event, 'phase', phase='scroll')
+            try:
+                reviewArea = selector_registry.find(browser, 'review_area', REVIEW_AREA_SELECTORS, timeout=4)
+                if not reviewArea:
+                    logger.warning("Could not find the scrollable review area.")
+                    return False
+
+                previous_reviews_count = 0
+                max_scroll_attempts = 100 if not early_stop else 50  # Fewer attempts if sorted
+                no_new_reviews_count = 0
+                # Stop once no new reviews arrived for this long (stop sooner if sorted)
+                stop_after_idle_seconds = 6 if early_stop else 10
+                last_new_reviews_at = time.time()
+                early_stop_triggered = False
+                seen_batch_ids = set()
+
+                current_reviews_count = extract_and_prune() if prune_dom else count_review_nodes(browser)
+                logger.debug(f"Starting scroll to load reviews... (Early stop enabled: {early_stop}, DOM pruning: {prune_dom})")
+                for attempt in range(max_scroll_attempts):
+                    if is_cancelled(cancel_event):
+                        logger.info(f"Scrape cancelled during scrolling ({current_reviews_count} reviews loaded).")
+                        EARLY_STOPS.inc(reason='cancelled')
+                        break
+                    scroll_attempts += 1
+                    logger.debug("Scroll attempt %s/%s: Found %s reviews...", attempt + 1, max_scroll_attempts, current_reviews_count)
+                    emit_event(on_event, 'scroll', attempt=attempt + 1, max_attempts=max_scroll_attempts, reviews_loaded=current_reviews_count)
+
+                    # Early stopping logic when sorted by rating (pruning checks every batch while extracting)
+                    if early_stop and current_reviews_count >= 10:  # Check after we have some reviews
+                        should_stop = selector.extraction_stopped if prune_dom else check_early_stop_condition(browser, current_pass)
+                        if should_stop:
+                            logger.info(f"Early stop triggered! Found ratings outside {current_pass['stars']}. Stopping scroll.")
+                            early_stop_triggered = True
+                            EARLY_STOPS.inc(reason='rating')
+                            break
+
+                    # Newest first: stop once the loaded reviews are older than the cutoff
+                    if date_stop and current_reviews_count > 0:
+                        if selector.date_cutoff_reached if prune_dom else reached_date_cutoff(browser, since, scrape_date):
+                            logger.info(f"Date cutoff {since} reached. Stopping scroll.")
+                            EARLY_STOPS.inc(reason='date')
+                            break
+
+                    if current_reviews_count == previous_reviews_count:
+                        no_new_reviews_count += 1
+                        idle_seconds = time.time() - last_new_reviews_at
+                        if idle_seconds >= stop_after_idle_seconds:
+                            logger.info(f"No new reviews found for {idle_seconds:.1f}s ({no_new_reviews_count} attempts). Assuming all loaded ({current_reviews_count} total).")
+                            break
+                    else:
+                        no_new_reviews_count = 0
+                        last_new_reviews_at = time.time()
+
+                    # Incremental mode: stop as soon as a whole new batch is already known
+                    if incremental and known_review_ids and current_reviews_count > previous_reviews_count:
+                        batch_ids = [review_id for review_id in loaded_review_ids(browser) if review_id not in seen_batch_ids]
+                        seen_batch_ids.update(batch_ids)
+                        if batch_ids and all(review_id in known_review_ids for review_id in batch_ids):
+                            logger.info(f"Incremental stop: all {len(batch_ids)} reviews of the latest batch are already known.")
+                            EARLY_STOPS.inc(reason='incremental')
+                            break
+
+                    previous_reviews_count = current_reviews_count
+                    # Scroll and return as soon as the next batch is rendered (or the idle window passes)
+                    if tab is None:
+                        scroll_result = scroll_and_wait(browser, reviewArea, previous_reviews_count)
+                    else:
+                        # Other tabs run while this batch loads, so the wait is usually over when we come back
+                        start_scroll(browser, reviewArea)
+                        yield
+                        scroll_result = wait_for_review_nodes(browser, SCROLL_IDLE_TIMEOUT, previous_reviews_count)
+                    current_reviews_count = scroll_result['count']
+                    scroll_batches += 1
+                    scroll_batch_ms += scroll_result['elapsed_ms']
+                    SCROLL_BATCH_SECONDS.observe(scroll_result['elapsed_ms'] / 1000)
+                    if collector is not None:
+                        # Read response bodies while Chrome still buffers them
+                        collector.poll()
+                    if prune_dom and current_reviews_count > previous_reviews_count:
+                        current_reviews_count = extract_and_prune()
+
+                if early_stop_triggered:
+                    logger.info(f"Scrolling stopped early due to rating optimization. Found {previous_reviews_count} reviews.")
+                else:
+                    logger.info(f"Scrolling finished. Found {previous_reviews_count} reviews in total.")
+
+            except Exception as e:
+                logger.warning(f"Error during scrolling: {e}. Proceeding with currently loaded reviews.")
+
+            emit_event(on_event, 'phase', phase='extract')
+            if prune_dom:
+                # Only the batch that was loaded when scrolling stopped is left
+                if not selector.extraction_stopped:
+                    add_records(selector.select(read_unpruned_reviews(browser, collector)))
+            else:
+                if collector is not None:
+                    raw_reviews = merge_network_reviews(browser, collector)
+                else:
+                    # Read every loaded review in a single round-trip; Python only filters and normalizes
+                    raw_reviews = extract_raw_reviews(browser)['reviews']
+                logger.debug(f"Extracting details from {len(raw_reviews)} loaded reviews...")
+                add_records(selector.select(raw_reviews))
+            return True
+
+        for current_pass in sort_passes:
+            if is_cancelled(cancel_event):
+                break
+            sorted_by_order = False
+            if current_pass['order']:
+                emit_event(on_event, 'phase', phase='sort')
+                sorted_by_order = sort_reviews(browser, current_pass['order'])
+                if not sorted_by_order:
+                    if incremental:
+                        logger.warning("Incremental mode without newest-first order: known reviews may not be contiguous.")
+                    else:
+                        # Without the sorted order one scan of the default order has to cover every selected star
+                        current_pass = sort_pass(None, selected_stars)
+
+            selector.start_pass(current_pass)
+            scrolled = yield from scroll_and_extract(
+                early_stop=sorted_by_order and current_pass['order'] in ('lowest', 'highest'),
+                date_stop=bool(since) and sorted_by_order and current_pass['order'] == 'newest')
+            if not scrolled:
+                return []
+            if current_pass['order'] is None:
+                break
+
+        logger.info(f"Extracted {extracted_count} unique reviews with selected star ratings.")
+
+        page_stats = {'lean': lean, 'prune_dom': prune_dom, 'sort_passes': [item['order'] for item in sort_passes],
+                      **page_transfer_stats(browser), 'browser_rss_mb': round(driver.rss_mb()),
+                      'scroll_batches': scroll_batches, 'scroll_batch_ms': scroll_batch_ms,
+                      'avg_scroll_batch_ms': round(scroll_batch_ms / scroll_batches, 1) if scroll_batches else None}
+        lean_mode_stats.record_scrape(lean, page_stats)
+        logger.info(f"Page stats: {page_stats}", extra={'page_stats': page_stats})
+        outcome = 'cancelled' if is_cancelled(cancel_event) else 'ok'
+        REVIEWS_EXTRACTED.inc(extracted_count)
+
+        emit_event(on_event, 'summary', place_url=base_url, business=business_data, cancelled=is_cancelled(cancel_event),
+                   page_stats=page_stats)
+        if incremental:
+            # A cancelled run may have read only the newest part of the new reviews; marking them
+            # as seen would make the next run stop before the older unseen ones
+            if is_cancelled(cancel_event):
+                known_total = len(known_review_ids)
+                logger.info("Incremental mode: scrape cancelled, known reviews left unchanged.")
+            else:
+                known_total = seen_review_store.add(base_url, selector.processed_review_ids)
+                logger.info(f"Incremental mode: {known_total} reviews known for this place after merge.")
+            emit_event(on_event, 'summary', new_reviews_count=extracted_count, known_reviews_total=known_total)
+        emit_event(on_event, 'phase', phase='done')
+        
+    except Exception as e:
+        logger.error(f"An unexpected error occurred during the scraping process: {e}")
+        discard_driver = True
+        return []
+    finally:
+        phase_timer.finish()
+        SCRAPES.inc(outcome=outcome)
+        SCROLL_ATTEMPTS.observe(scroll_attempts)
+        if tab is not None:
+            # The scheduler counts commands per tab and releases the shared driver
+            tab.failed = discard_driver
+        else:
+            WEBDRIVER_COMMANDS.observe(browser.command_count - commands_at_start)
+            driver_pool.release(driver, discard=discard_driver)
+            logger.debug("Chrome driver returned to pool.")
+
+    return all_reviews
+
+def parse_review_total(total_reviews_text):
+    """
+    "(1,234)" or "1.234 Rezensionen" -> 1234; 0 when unknown.
+    """
+    digits = re.sub(r'\D', '', total_reviews_text or '')
+    return int(digits) if digits else 0
+
+def read_unpruned_reviews(browser, collector=None):
+    """
+    Raw reviews of the review nodes that were not pruned yet, taken from the
+    captured network responses where available.
+    """
+    raw_reviews = extract_raw_reviews(browser, unpruned_only=True)['reviews']
+    if collector is not None:
+        collector.poll()
+        raw_reviews = [collector.reviews.pop(raw['review_id'], raw) for raw in raw_reviews]
+    return raw_reviews
+
+def merge_network_reviews(browser, collector):
+    """
+    Raw reviews in page order: captured from the network where possible, read
+    from the DOM (in one call) for the rest.
+    """
+    try:
+        collector.poll()
+    except Exception as e:
+        logger.warning(f"Could not read the last review responses: {e}")
+    page_ids = loaded_review_ids(browser)
+    dom_reviews = {raw['review_id']: raw for raw in
+                   extract_raw_reviews(browser, skip_ids=list(collector.reviews))['reviews']}
+    raw_reviews = []
+    for review_id in page_ids:
+        raw = collector.reviews.get(review_id) or dom_reviews.get(review_id)
+        if raw is not None:
+            raw_reviews.append(raw)
+    logger.info(f"Network capture: {len(collector.reviews)} reviews from {collector.responses} responses, "
+                f"{len(dom_reviews)} read from the DOM")
+    return raw_reviews
+
+def scrape_and_store(business_name, location, selected_stars, on_event=None, **options):
+    """
+    Run a scrape and persist its results in the review store.
+    Emits an extra 'summary' event with the stored business_id.
+    """
+    return run_steps(scrape_and_store_steps(business_name, location, selected_stars, on_event=on_event, **options))
+
+def admission_weight(backend):
+    """
+    Admission slots a scrape on this backend takes: a whole driver for Selenium,
+    a share of the one Chromium for async scrapes.
+    """
+    return ASYNC_WEIGHT if backend == 'async' and ASYNC_BACKEND_AVAILABLE else 1.0
+
+def scrape_and_store_steps(business_name, location, selected_stars, on_event=None, backend=SCRAPER_BACKEND,
+                           admission_timeout=ADMISSION_QUEUE_TIMEOUT, **options):
+    """
+    scrape_and_store as steps (see scrape_steps), for TabScheduler.
+    backend='async' runs the scrape on the asyncio backend instead, in one step.
+    The scrape first waits up to admission_timeout seconds for an admission slot
+    (None waits indefinitely); raises AdmissionRejected when the host stays saturated.
+    """
+    summary = {}
+    def forward(event):
+        if event['type'] == 'summary':
+            summary.update(event)
+        emit_event(on_event, event['type'], **{key: value for key, value in event.items() if key != 'type'})
+
+    # Tabs run in the driver their scheduler was admitted for, so only standalone scrapes are admitted here
+    admitted = options.get('tab') is None
+    weight = admission_weight(backend)
+    if admitted:
+        started = time.monotonic()
+        if not admission.acquire(admission_timeout, options.get('cancel_event'), weight=weight):
+            logger.info("Scrape cancelled while waiting for admission.")
+            emit_event(on_event, 'summary', cancelled=True)
+            return []
+    try:
+        if backend == 'async' and ASYNC_BACKEND_AVAILABLE:
+            reviews = async_runner.scrape(business_name, location, selected_stars, on_event=forward, **options)
+        else:
+            if backend != 'sync':
+                logger.warning(f"Scraper backend '{backend}' is not available, using the Selenium driver pool.")
+            reviews = yield from scrape_steps(business_name, location, selected_stars, on_event=forward, **options)
+    finally:
+        if admitted:
+            admission.release(time.monotonic() - started, weight=weight)
+    if summary.get('place_url'):
+        try:
+            business_id = review_store.save_scrape(summary['place_url'], summary.get('business', {}), reviews)
+            emit_event(on_event, 'summary', business_id=business_id)
+        except Exception as e:
+            logger.error(f"Could not store scraped reviews: {e}")
+    return reviews
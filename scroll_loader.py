@@ -0,0 +1,152 @@
+import os
+
+from review_extraction import run_script
+
+# Extract and prune every loaded batch while scrolling: on (True), off (False) or
+# only for places with at least PRUNE_DOM_MIN_REVIEWS reviews (unset)
+PRUNE_DOM_DEFAULT = {'1': True, '0': False}.get(os.environ.get('PRUNE_DOM', ''))
+PRUNE_DOM_MIN_REVIEWS = int(os.environ.get('PRUNE_DOM_MIN_REVIEWS', 1000))
+# Seconds to wait for a scroll batch before counting the attempt as idle
+SCROLL_IDLE_TIMEOUT = 2.0
+# Quiet time that marks a batch as fully rendered once new nodes showed up
+SETTLE_TIME = 0.15
+
+# Scrolls the review panel (optional) and resolves as soon as more review nodes
+# than `previous_count` exist and the DOM went quiet for `settle_ms`, or after
+# `idle_ms` without new reviews. A MutationObserver reacts immediately; the
+# interval poll covers mutations that happen outside the observed subtree.
+SCROLL_AND_WAIT_FN = r"""
+(opts) => new Promise((resolve) => {
+    const selector = opts.selector || 'div[data-review-id]';
+    const count = () => document.querySelectorAll(selector).length;
+    const start = performance.now();
+    let done = false;
+    let settleTimer = null;
+
+    const finish = (reason) => {
+        if (done) {
+            return;
+        }
+        done = true;
+        observer.disconnect();
+        clearInterval(poll);
+        clearTimeout(idleTimer);
+        clearTimeout(settleTimer);
+        resolve({count: count(), reason: reason, elapsed_ms: Math.round(performance.now() - start)});
+    };
+    const check = () => {
+        if (count() > opts.previous_count) {
+            // New reviews arrived; wait until the batch stops changing
+            clearTimeout(settleTimer);
+            settleTimer = setTimeout(() => finish('loaded'), opts.settle_ms);
+        }
+    };
+
+    const observer = new MutationObserver(check);
+    observer.observe(document.body, {childList: true, subtree: true});
+    const poll = setInterval(check, 100);
+    const idleTimer = setTimeout(() => finish('idle'), opts.idle_ms);
+
+    if (opts.scroll_element) {
+        opts.scroll_element.scrollTop = opts.scroll_element.scrollHeight;
+    }
+    check();
+})
+"""
+
+# Resolves once the DOM saw no mutations for `quiet_ms` (or after `timeout_ms`)
+WAIT_FOR_QUIET_FN = r"""
+(opts) => new Promise((resolve) => {
+    const start = performance.now();
+    let quietTimer = null;
+    const finish = (reason) => {
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(timeoutTimer);
+        resolve({reason: reason, elapsed_ms: Math.round(performance.now() - start)});
+    };
+    const restart = () => {
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(() => finish('quiet'), opts.quiet_ms);
+    };
+    const observer = new MutationObserver(restart);
+    observer.observe(document.body, {childList: true, subtree: true, attributes: true});
+    const timeoutTimer = setTimeout(() => finish('timeout'), opts.timeout_ms);
+    restart();
+})
+"""
+
+# Resolves as soon as any of the CSS selectors matches (or after `timeout_ms`)
+WAIT_FOR_ANY_FN = r"""
+(opts) => new Promise((resolve) => {
+    const start = performance.now();
+    const match = () => opts.selectors.find((selector) => document.querySelector(selector));
+    const check = () => {
+        const found = document.readyState !== 'loading' ? match() : undefined;
+        if (found || performance.now() - start >= opts.timeout_ms) {
+            clearInterval(poll);
+            resolve({selector: found || null, elapsed_ms: Math.round(performance.now() - start)});
+        }
+    };
+    const poll = setInterval(check, 50);
+    check();
+})
+"""
+
+
+def count_review_nodes(browser):
+    return browser.execute_script("return document.querySelectorAll('div[data-review-id]').length;")
+
+
+def scroll_and_wait(browser, review_area, previous_count, idle_timeout=SCROLL_IDLE_TIMEOUT, settle=SETTLE_TIME):
+    """
+    Scroll the review panel once and wait for the next batch of reviews.
+    Returns a dict with the review node `count`, the `reason` ('loaded' or 'idle')
+    and `elapsed_ms`.
+    """
+    return run_script(browser, SCROLL_AND_WAIT_FN, {
+        'scroll_element': review_area,
+        'previous_count': previous_count,
+        'idle_ms': int(idle_timeout * 1000),
+        'settle_ms': int(settle * 1000),
+    })
+
+
+def start_scroll(browser, review_area):
+    """
+    Scroll the review panel to the bottom without waiting, so the next batch loads
+    while the browser works on another tab. Pair with wait_for_review_nodes.
+    """
+    browser.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight;", review_area)
+
+
+def wait_for_review_nodes(browser, timeout, previous_count=0, settle=SETTLE_TIME):
+    """
+    Wait until more than `previous_count` review nodes are rendered, without scrolling.
+    """
+    return run_script(browser, SCROLL_AND_WAIT_FN, {
+        'scroll_element': None,
+        'previous_count': previous_count,
+        'idle_ms': int(timeout * 1000),
+        'settle_ms': int(settle * 1000),
+    })
+
+
+def wait_for_dom_quiet(browser, timeout, quiet=0.3):
+    """
+    Wait until the page stops mutating for `quiet` seconds, at most `timeout` seconds.
+    """
+    return run_script(browser, WAIT_FOR_QUIET_FN, {
+        'quiet_ms': int(quiet * 1000),
+        'timeout_ms': int(timeout * 1000),
+    })
+
+
+def wait_for_any(browser, selectors, timeout):
+    """
+    Wait until one of the CSS selectors matches. Returns the matching selector or None.
+    """
+    return run_script(browser, WAIT_FOR_ANY_FN, {
+        'selectors': list(selectors),
+        'timeout_ms': int(timeout * 1000),
+    })['selector']
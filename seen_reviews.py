@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from file_store import file_lock, write_json_atomic
+
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+
+
+class SeenReviewStore:
+    """
+    Persistent set of already scraped review ids per place.
+    Each place (keyed by its resolved Maps URL) is one small JSON file. Batch workers
+    and the monitor merge into the same files, so add() holds an inter-process lock.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(DATA_DIR, 'seen_reviews')
+        self._lock = threading.Lock()
+
+    def _path(self, place_url):
+        digest = hashlib.sha1(place_url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{digest}.json')
+
+    def _read(self, place_url):
+        try:
+            with open(self._path(place_url), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'place_url': place_url, 'review_ids': []}
+
+    def load(self, place_url):
+        """
+        Returns the set of review ids already seen for this place.
+        """
+        with self._lock:
+            return set(self._read(place_url)['review_ids'])
+
+    def add(self, place_url, review_ids):
+        """
+        Merge newly seen review ids and return the total number of known reviews.
+        """
+        path = self._path(place_url)
+        with self._lock, file_lock(path):
+            data = self._read(place_url)
+            known = set(data['review_ids'])
+            known.update(review_ids)
+            data['review_ids'] = sorted(known)
+            data['updated_at'] = time.time()
+            write_json_atomic(path, data)
+            return len(known)
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from metrics import SELECTOR_FALLBACKS, SELECTOR_MISSES
+from review_extraction import run_script
+from seen_reviews import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+SELECTOR_REGISTRY_PATH = os.environ.get('SELECTOR_REGISTRY_PATH', os.path.join(DATA_DIR, 'selectors.json'))
+# Hit counts alone are written at most this often; a new winner is written right away
+STATS_SAVE_INTERVAL = 60
+
+# Probes every candidate of every group on each tick (XPath when it starts with
+# "/" or "(", CSS otherwise) and resolves once each group has a match or after
+# `timeout_ms`. Candidates are tried in the given order, so the caller decides
+# which one wins when several match. Returns the matched element, its text, the
+# candidate index per group (-1 when nothing matched) and the page language.
+PROBE_SELECTORS_FN = r"""
+(opts) => new Promise((resolve) => {
+    const start = performance.now();
+    const isVisible = (el) => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    const query = (candidate) => {
+        try {
+            if (candidate.startsWith('/') || candidate.startsWith('(')) {
+                return document.evaluate(candidate, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+            }
+            return document.querySelector(candidate);
+        } catch (e) {
+            return null;
+        }
+    };
+    const found = {};
+    const probe = () => {
+        for (const group of opts.groups) {
+            if (found[group.name]) {
+                continue;
+            }
+            for (let i = 0; i < group.candidates.length; i++) {
+                const el = query(group.candidates[i]);
+                if (el && (!group.visible || isVisible(el))) {
+                    found[group.name] = {index: i, element: el, text: (el.innerText || el.textContent || '').trim()};
+                    break;
+                }
+            }
+        }
+        return opts.groups.every((group) => found[group.name]);
+    };
+    const finish = () => {
+        const results = {};
+        for (const group of opts.groups) {
+            results[group.name] = found[group.name] || {index: -1, element: null, text: null};
+        }
+        resolve({results: results, variant: document.documentElement.lang || '',
+                 elapsed_ms: Math.round(performance.now() - start)});
+    };
+    const tick = () => {
+        if (probe() || performance.now() - start >= opts.timeout_ms) {
+            finish();
+        } else {
+            setTimeout(tick, 100);
+        }
+    };
+    tick();
+})
+"""
+
+# The same probe for drivers that cannot return elements (Playwright's page.evaluate)
+PROBE_TEXTS_FN = r"""
+async (opts) => {
+    const probe = await (%s)(opts);
+    for (const result of Object.values(probe.results)) {
+        delete result.element;
+    }
+    return probe;
+}
+""" % PROBE_SELECTORS_FN.strip()
+
+
+class SelectorRegistry:
+    """
+    Remembers which fallback selector matched for each element group (per page
+    language) and tries the last winner first next time. All candidates are
+    probed in one in-page call, so a dead selector costs no extra timeout.
+    Winners and hit counts are persisted as a JSON file, rewritten when a
+    winner changes and otherwise at most every save_interval seconds; with
+    several processes the last writer wins, which only affects the statistics,
+    not correctness.
+    """
+
+    def __init__(self, path=SELECTOR_REGISTRY_PATH, save_interval=STATS_SAVE_INTERVAL):
+        self.path = path
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._last_saved = time.monotonic()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self._groups = json.load(f)
+        except (OSError, ValueError):
+            self._groups = {}
+
+    def _group(self, name):
+        # Called with the lock held
+        return self._groups.setdefault(name, {'lookups': 0, 'misses': 0, 'first_choice_hits': 0,
+                                              'wasted_ms': 0, 'last_variant': '', 'variants': {}})
+
+    def ordered(self, name, candidates, variant=None):
+        """
+        Candidates with the last winner first, then by number of wins, then in the given order.
+        Without a variant the most recently seen page language of the group is used.
+        """
+        with self._lock:
+            group = self._groups.get(name, {})
+            if variant is None:
+                variant = group.get('last_variant', '')
+            stats = group.get('variants', {}).get(variant)
+        if not stats:
+            return list(candidates)
+        wins = stats.get('wins', {})
+        last_winner = stats.get('last_winner')
+        return sorted(candidates, key=lambda candidate: (candidate != last_winner, -wins.get(candidate, 0)))
+
+    def find_all(self, browser, groups, timeout, variant=None):
+        """
+        Probe several element groups at once. `groups` maps a group name to its
+        candidate selectors, or to (candidates, visible) when the element must be
+        visible (e.g. to click it). Returns {name: (element, text)} with
+        (None, None) for groups that did not match within `timeout` seconds.
+        """
+        specs = self._probe_specs(groups, variant)
+        probe = run_script(browser, PROBE_SELECTORS_FN, {'groups': specs, 'timeout_ms': int(timeout * 1000)})
+        winners = self._record_probe(specs, probe, variant)
+        return {name: (probe['results'][name]['element'], probe['results'][name]['text']) for name in winners}
+
+    async def find_all_async(self, page, groups, timeout, variant=None):
+        """
+        find_all for a Playwright page. Returns {name: (locator, text)}: the winning
+        selector as a locator, since elements do not survive page.evaluate.
+        """
+        specs = self._probe_specs(groups, variant)
+        probe = await page.evaluate(PROBE_TEXTS_FN, {'groups': specs, 'timeout_ms': int(timeout * 1000)})
+        winners = self._record_probe(specs, probe, variant)
+        found = {}
+        for name, winner in winners.items():
+            if winner is None:
+                found[name] = (None, None)
+            else:
+                selector = f'xpath={winner}' if winner.startswith(('/', '(')) else winner
+                found[name] = (page.locator(selector).first, probe['results'][name]['text'])
+        return found
+
+    def _probe_specs(self, groups, variant):
+        specs = []
+        for name, spec in groups.items():
+            candidates, visible = spec if isinstance(spec, tuple) else (spec, False)
+            specs.append({'name': name, 'candidates': self.ordered(name, candidates, variant), 'visible': visible})
+        return specs
+
+    def _record_probe(self, specs, probe, variant):
+        # Record the outcome of a probe and return the winning candidate (or None) per group
+        variant = probe.get('variant') or variant or ''
+        winners = {}
+        changed = False
+        for spec in specs:
+            result = probe['results'][spec['name']]
+            winner = spec['candidates'][result['index']] if result['index'] >= 0 else None
+            changed |= self._record(spec['name'], variant, winner, first_choice=result['index'] == 0,
+                                    wasted_ms=0 if winner else probe['elapsed_ms'])
+            winners[spec['name']] = winner
+        if changed or time.monotonic() - self._last_saved >= self.save_interval:
+            self._save()
+        return winners
+
+    def find(self, browser, name, candidates, timeout, visible=False):
+        """
+        Returns the first matching element of one group, or None after `timeout` seconds.
+        """
+        return self.find_all(browser, {name: (candidates, visible)}, timeout)[name][0]
+
+    def _record(self, name, variant, winner, first_choice, wasted_ms):
+        # True when the order of the next lookup changes (new winner or page language)
+        if winner is None:
+            SELECTOR_MISSES.inc(group=name)
+        elif not first_choice:
+            SELECTOR_FALLBACKS.inc(group=name)
+        with self._lock:
+            group = self._group(name)
+            group['lookups'] += 1
+            changed = group['last_variant'] != variant
+            group['last_variant'] = variant
+            if winner is None:
+                group['misses'] += 1
+                group['wasted_ms'] += wasted_ms
+                return changed
+            if first_choice:
+                group['first_choice_hits'] += 1
+            stats = group['variants'].setdefault(variant, {'last_winner': None, 'wins': {}})
+            changed |= stats['last_winner'] != winner
+            stats['last_winner'] = winner
+            stats['wins'][winner] = stats['wins'].get(winner, 0) + 1
+            stats['updated_at'] = time.time()
+            return changed
+
+    def _save(self):
+        # One writer at a time, so an older snapshot never replaces a newer one
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self._groups, ensure_ascii=False)
+            self._last_saved = time.monotonic()
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                tmp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Could not save selector registry: {e}")
+
+    def stats(self):
+        """
+        Per group: lookups, hit rate, how often the first tried candidate won,
+        time spent waiting on misses and the wins of every candidate per variant.
+        """
+        with self._lock:
+            report = {}
+            for name, group in self._groups.items():
+                lookups = group['lookups']
+                report[name] = {
+                    'lookups': lookups,
+                    'misses': group['misses'],
+                    'hit_rate': round((lookups - group['misses']) / lookups, 3) if lookups else None,
+                    'first_choice_rate': round(group['first_choice_hits'] / lookups, 3) if lookups else None,
+                    'wasted_ms': group['wasted_ms'],
+                    'variants': {variant: {'last_winner': stats['last_winner'], 'wins': dict(stats['wins'])}
+                                 for variant, stats in group['variants'].items()},
+                }
+            return report
@@ -0,0 +1,81 @@
+"""
+Choose how to order the reviews for a star selection so scrolling can stop early.
+
+Sorted by lowest rating, every wanted review has been seen once a rating above
+the highest wanted one shows up; sorted by highest rating, once one below the
+lowest wanted one shows up. A selection with a gap (e.g. [1, 5]) can also be
+read in two sorted passes. The plan with the fewest expected review loads wins,
+estimated from the place's rating histogram.
+"""
+
+# Typical share of each rating, scaled to DEFAULT_REVIEW_TOTAL, when the place's histogram could not be read
+DEFAULT_RATING_SHARES = {1: 0.10, 2: 0.04, 3: 0.06, 4: 0.15, 5: 0.65}
+DEFAULT_REVIEW_TOTAL = 500
+# Extra cost of a second pass (re-sorting and reloading the first batches), in reviews
+PASS_OVERHEAD_REVIEWS = 30
+
+
+def sort_pass(order, stars):
+    """
+    One scroll over the reviews in `order` ('lowest', 'highest', 'newest' or None
+    for the default order) selecting `stars`.
+    """
+    return {'order': order, 'stars': sorted(stars)}
+
+
+def rating_counts(histogram):
+    """
+    Review count per rating (1-5) from a histogram with int or str keys (str after a
+    JSON round-trip), or an estimate from the default shares.
+    """
+    histogram = histogram or {}
+    counts = {rating: int(histogram.get(rating, histogram.get(str(rating))) or 0) for rating in range(1, 6)}
+    if sum(counts.values()):
+        return counts
+    return {rating: share * DEFAULT_REVIEW_TOTAL for rating, share in DEFAULT_RATING_SHARES.items()}
+
+
+def estimated_loads(plan, counts):
+    """
+    Expected number of reviews loaded by a plan: a lowest pass reads every review
+    up to its highest star, a highest pass every review down to its lowest star.
+    """
+    total = PASS_OVERHEAD_REVIEWS * (len(plan) - 1)
+    for item in plan:
+        if item['order'] == 'lowest':
+            total += sum(counts[rating] for rating in range(1, max(item['stars']) + 1))
+        elif item['order'] == 'highest':
+            total += sum(counts[rating] for rating in range(min(item['stars']), 6))
+        else:
+            total += sum(counts.values())
+    return total
+
+
+def plan_sort_passes(selected_stars, histogram=None):
+    """
+    Returns the cheapest list of passes that together read every wanted review.
+    """
+    stars = sorted(set(int(star) for star in selected_stars))
+    counts = rating_counts(histogram)
+    candidates = [
+        [sort_pass(None, stars)],
+        [sort_pass('lowest', stars)],
+        [sort_pass('highest', stars)],
+    ]
+    # Two passes split at a gap in the selection, e.g. [1, 2, 5] -> lowest [1, 2] + highest [5]
+    for index in range(1, len(stars)):
+        if stars[index] - stars[index - 1] > 1:
+            candidates.append([sort_pass('lowest', stars[:index]), sort_pass('highest', stars[index:])])
+    # Ties keep the earlier candidate, so an unsorted scan is preferred when sorting saves nothing
+    return min(candidates, key=lambda plan: estimated_loads(plan, counts))
+
+
+def past_wanted_range(planned_pass, rating):
+    """
+    True when a review with this rating shows that a sorted pass has read all of its stars.
+    """
+    if planned_pass['order'] == 'lowest':
+        return rating > max(planned_pass['stars'])
+    if planned_pass['order'] == 'highest':
+        return rating < min(planned_pass['stars'])
+    return False
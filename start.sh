@@ -9,4 +9,4 @@ apt-get update
 apt-get install -y google-chrome-stable
 
 # Start the Flask app
-exec gunicorn app_flask:app --bind 0.0.0.0:$PORT --workers 1 --timeout 120
+exec gunicorn app_flask:app --bind 0.0.0.0:$PORT --workers 1 --threads 2 --timeout 120
@@ -0,0 +1,141 @@
+"""
+Several scrapes in the tabs of one Chrome driver.
+
+A scrape spends most of its time waiting for the next review batch. Here each
+scrape runs as a generator of steps (see scrape_steps in scraper) that yields
+right after it starts a scroll. The scheduler switches to the next tab and runs
+its step while the first tab's batch loads, round-robin, so one browser process
+serves several businesses at once.
+"""
+import logging
+import os
+import time
+from collections import deque
+
+from metrics import WEBDRIVER_COMMANDS
+
+logger = logging.getLogger(__name__)
+
+# Businesses scraped at once in one driver (overridable through the environment)
+TABS_PER_BROWSER = int(os.environ.get('CHROME_TABS_PER_BROWSER', 4))
+
+
+def run_steps(steps):
+    """
+    Run a scrape's steps to completion in the current tab and return its result.
+    """
+    try:
+        while True:
+            next(steps)
+    except StopIteration as stop:
+        return stop.value
+
+
+class BrowserTab:
+    """
+    One tab of a shared driver and the scrape currently running in it.
+    """
+
+    def __init__(self, driver, handle):
+        self.driver = driver
+        self.handle = handle
+        self.steps = None
+        self.index = None
+        self.commands = 0
+        # Set by the scrape when the driver should not be reused
+        self.failed = False
+
+
+class TabScheduler:
+    """
+    Runs scrapes in up to max_tabs tabs of one leased driver and round-robins
+    their steps. A tab that finishes starts the next pending scrape. With an
+    AdmissionController the driver lease first waits for one admission slot.
+    """
+
+    def __init__(self, steps_func, driver_pool, max_tabs=TABS_PER_BROWSER, admission=None):
+        self.steps_func = steps_func
+        self.driver_pool = driver_pool
+        self.max_tabs = max(1, max_tabs)
+        self.admission = admission
+
+    def run(self, scrapes):
+        """
+        Run scrapes given as dicts with business_name, location, selected_stars and
+        optional on_event and options. Returns the reviews of each scrape in input
+        order; a scrape that failed returns an empty list.
+        """
+        results = [[] for _ in scrapes]
+        if not scrapes:
+            return results
+
+        if self.admission is None:
+            return self._run(scrapes, results)
+        # The scrapes are queued work already (batch rows), so they wait for the slot
+        started = time.monotonic()
+        self.admission.acquire(timeout=None)
+        try:
+            return self._run(scrapes, results)
+        finally:
+            self.admission.release(time.monotonic() - started)
+
+    def _run(self, scrapes, results):
+        driver = self.driver_pool.acquire()
+        browser = driver.browser
+        pending = deque(enumerate(scrapes))
+        tabs = []
+        discard_driver = False
+        try:
+            for number in range(min(self.max_tabs, len(scrapes))):
+                if number:
+                    browser.switch_to.new_window('tab')
+                tabs.append(BrowserTab(driver, browser.current_window_handle))
+            logger.info(f"Scraping {len(scrapes)} businesses in {len(tabs)} tabs of one driver")
+
+            for tab in tabs:
+                self._start_next(tab, pending)
+            while any(tab.steps is not None for tab in tabs):
+                for tab in tabs:
+                    if tab.steps is None:
+                        continue
+                    browser.switch_to.window(tab.handle)
+                    commands_before = browser.command_count
+                    try:
+                        next(tab.steps)
+                        finished = False
+                    except StopIteration as stop:
+                        results[tab.index] = stop.value or []
+                        finished = True
+                    tab.commands += browser.command_count - commands_before
+                    if finished:
+                        WEBDRIVER_COMMANDS.observe(tab.commands)
+                        discard_driver = discard_driver or tab.failed
+                        self._start_next(tab, pending)
+        except Exception as e:
+            # The driver itself broke (a crashed tab or lost session); the other scrapes stop too
+            logger.error(f"❌ Tab scheduler failed: {e}")
+            discard_driver = True
+        finally:
+            for tab in tabs:
+                if tab.steps is not None:
+                    tab.steps.close()
+            # Back to the first tab: the driver reset switches lean mode off there and closes the others
+            if tabs and not discard_driver:
+                try:
+                    browser.switch_to.window(tabs[0].handle)
+                except Exception:
+                    discard_driver = True
+            # Any of the scrapes may have switched lean mode on
+            driver.lean = True
+            self.driver_pool.release(driver, discard=discard_driver)
+        return results
+
+    def _start_next(self, tab, pending):
+        tab.steps = None
+        if not pending:
+            return
+        tab.index, scrape = pending.popleft()
+        tab.commands = 0
+        tab.failed = False
+        tab.steps = self.steps_func(scrape['business_name'], scrape['location'], scrape['selected_stars'],
+                                    on_event=scrape.get('on_event'), tab=tab, **scrape.get('options', {}))